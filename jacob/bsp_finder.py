@@ -11,6 +11,23 @@ from webdriver_manager.chrome import ChromeDriverManager
 import logging
 import os
 import csv
+import gzip
+import zlib
+import re
+import multiprocessing
+import statistics
+import cProfile
+import pstats
+import tracemalloc
+import io
+import hashlib
+import base64
+import json
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
 # *** NEW: Imports for the file dialog box ***
 from tkinter import filedialog, Tk
 
@@ -41,7 +58,8 @@ logger.setLevel(logging.DEBUG)
 for handler in logger.handlers[:]: logger.removeHandler(handler)
 
 log_file_path = 'bsp_scraping_detailed.log'
-if os.path.exists(log_file_path):
+# Worker processes (offline snapshot extraction) re-import this module; they must not wipe the parent's log.
+if os.path.exists(log_file_path) and multiprocessing.parent_process() is None:
     try: os.remove(log_file_path); print(f"Removed old log file: {log_file_path}")
     except OSError as e: print(f"Error removing old log file '{log_file_path}': {e}")
 
@@ -68,16 +86,198 @@ CODE_TO_ID_MAP = {
     "r": "thoroughbred", "g": "greyhound", "h": "harness"
 }
 MAX_VENUE_FAILURES_PER_DATE = 2
+OUTPUT_FILENAME = "final_results.csv"
+# 'BSP Price Win' values (lowercase) that mean the script could not get a price for the row.
+SCRIPT_ERROR_VALUES = [
+    'date previously failed this phase', 'date selection error', 'date data not loaded',
+    'unknown race code', 'code selection error', 'venue load error', 'driver setup error phase',
+    'date parse error for grouping', 'venue data unavailable', 'venue element error',
+    'venue element error mid-race', 'race timeout', 'race element missing',
+    'race stale element', 'race error', 'runner not found on page',
+    'stale element', 'scrape error', 'processing incomplete', 'ambiguous fuzzy match',
+    'snapshot not found'
+]
+
+# --- In-process Retry Queue ---
+# Failed groups (date/code/venue navigation) and transiently failed races are re-queued within the same
+# browser session with exponential backoff (RETRY_BACKOFF_BASE_SECONDS * 2^(attempt-2)) and fuzzy venue
+# matching, up to RETRY_MAX_ATTEMPTS attempts in total before they receive their final error status.
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_BASE_SECONDS = 5
+RETRYABLE_RACE_ERRORS = {'Race Timeout', 'Race Stale Element', 'Venue Element Error Mid-Race'}
+
+# --- Multi-tab Scraping ---
+# Number of tabs (window handles) driven inside the single Chrome instance. Tabs take different dates
+# where possible; every page wait (calendar, code and venue filters, race tabs, popups, spinners) is cooperative,
+# so while one tab waits the scheduler advances the others. Individual driver commands (page loads, clicks) still block.
+TABS_PER_BROWSER = 1
+TAB_POLL_INTERVAL_SECONDS = 0.25
+
+# --- Page Snapshot Store ---
+# When enabled, the rendered runners panel of every scraped race is saved (gzip) under
+# SNAPSHOT_STORE_DIR/<YYYY-MM-DD>/<code>/<venue>_R<raceno>.html.gz so BSP can be re-extracted offline.
+SAVE_PAGE_SNAPSHOTS = False
+SNAPSHOT_STORE_DIR = 'page_snapshots'
+# When enabled, __main__ skips the browser entirely and rebuilds results from the snapshot store.
+OFFLINE_REEXTRACT_FROM_SNAPSHOTS = False
+
+# --- Network Payload Capture ---
+# When enabled, Chrome's DevTools performance log records the JSON responses the results SPA loads after each
+# date/code/venue selection. BSP tables parsed from those payloads answer tasks directly (a date-level payload can
+# answer a whole date without any clicks); the rendered DOM is only scraped for races no payload covered.
+CAPTURE_NETWORK_PAYLOADS = False
+# Zoned payload timestamps are converted to the site's (Australian) race dates, whatever the host's time zone.
+PAYLOAD_RACE_TIMEZONE = 'Australia/Sydney'
+
+# --- Incremental Daily Runs ---
+# When enabled, INCREMENTAL_STATE_FILE (next to the output) records how far into the input CSV earlier runs read
+# and the rows still awaiting a result; fingerprints of processed rows go to an append-only '<state>.fingerprints'
+# store that is only read back when the input was rewritten rather than appended to. Each run then reads only the
+# bytes appended since, scrapes new rows plus earlier failures still inside the date window, and appends finished
+# rows to OUTPUT_FILENAME instead of rewriting it. Failed rows are held back and retried on later runs until they
+# succeed or leave the window, at which point they are written with their last error status.
+INCREMENTAL_MODE = False
+INCREMENTAL_STATE_FILE = 'bsp_incremental_state.json'
+
+# --- Historical Backfill ---
+# Set BACKFILL_START_DATE ('dd/mm/YYYY') to replace the daily 8-day window with an explicit date range.
+# BACKFILL_END_DATE defaults to today. Work is split into per-month chunks, run oldest first in one shared
+# browser session so the calendar only ever steps forward a month at a time, capped at BACKFILL_MAX_TASKS_PER_CHUNK
+# tasks, with a BACKFILL_COOLDOWN_SECONDS pause between chunks to stay under the site's throughput limits.
+BACKFILL_START_DATE = None
+BACKFILL_END_DATE = None
+BACKFILL_MAX_TASKS_PER_CHUNK = 1500
+BACKFILL_COOLDOWN_SECONDS = 30
+
+# --- Profiling ---
+# When enabled, each phase of a run writes cProfile stats, tracemalloc peak/top allocations and a
+# "waiting on WebDriver" / "idle (cooldown, retry backoff)" / "local compute" wall-time split into a per-run folder next to the log.
+ENABLE_PROFILING = False
+PROFILING_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(log_file_path)), 'bsp_profiling')
+
+# --- PhaseProfiler  ---
+class PhaseProfiler:
+    """
+    Opt-in per-phase profiler. Each phase gets its own cProfile dump, tracemalloc peak and top-allocation
+    diff, and a wall-time split. WebDriver wait time is every driver command (element calls included,
+    as they route through driver.execute), every WebDriverWait.until and the script's page-settle pauses
+    (page_settle), including the tab scheduler's pauses while a tab polls the page; overlapping waits are counted once.
+    Backfill cooldowns and scheduler pauses while every tab sits out a retry backoff (idle_sleep) are reported separately
+    as idle time. Phases may nest; a parent's figures include its children.
+    """
+    def __init__(self, output_dir, enabled=False):
+        self.output_dir = output_dir; self.enabled = enabled
+        self.webdriver_wait_seconds = 0.0; self.idle_seconds = 0.0
+        self._run_dir = None; self._phase_stack = []; self._phase_counter = 0; self._summary_rows = []
+        self._original_wait_until = None; self._webdriver_wait_depth = 0
+
+    def _timed_webdriver_wait(self, func, *args, **kwargs):
+        # Only the outermost wait is timed, so driver commands issued inside a WebDriverWait poll are not counted twice.
+        if not self.enabled or self._webdriver_wait_depth: return func(*args, **kwargs)
+        self._webdriver_wait_depth += 1; started_at = time.perf_counter()
+        try: return func(*args, **kwargs)
+        finally: self._webdriver_wait_depth -= 1; self.webdriver_wait_seconds += time.perf_counter() - started_at
+
+    def instrument_driver(self, driver):
+        """Wraps driver.execute so time spent waiting on the browser is accumulated."""
+        if not self.enabled: return driver
+        original_execute = driver.execute
+        driver.execute = lambda *args, **kwargs: self._timed_webdriver_wait(original_execute, *args, **kwargs)
+        return driver
+
+    def page_settle(self, seconds):
+        """time.sleep for the page to settle after an interaction; counted as waiting on WebDriver."""
+        self._timed_webdriver_wait(time.sleep, seconds)
+
+    def idle_sleep(self, seconds):
+        """time.sleep that is not waiting on the page (backfill cooldowns, retry backoffs); counted as idle time."""
+        started_at = time.perf_counter()
+        try: time.sleep(seconds)
+        finally:
+            if self.enabled: self.idle_seconds += time.perf_counter() - started_at
+
+    def start_phase(self, phase_name):
+        if not self.enabled: return
+        if self._run_dir is None:
+            self._run_dir = os.path.join(self.output_dir, datetime.now().strftime('%Y%m%d_%H%M%S'))
+            os.makedirs(self._run_dir, exist_ok=True)
+            logger.info(f"Profiling: Enabled. Writing phase profiles to '{self._run_dir}'.")
+        if not self._phase_stack:
+            self._original_wait_until = WebDriverWait.until
+            original_wait_until = self._original_wait_until
+            WebDriverWait.until = lambda wait_self, *args, **kwargs: self._timed_webdriver_wait(original_wait_until, wait_self, *args, **kwargs)
+            if not tracemalloc.is_tracing(): tracemalloc.start()
+        else:
+            parent_frame = self._phase_stack[-1]
+            parent_frame['profile'].disable()
+            parent_frame['peak_bytes'] = max(parent_frame['peak_bytes'], tracemalloc.get_traced_memory()[1])
+        full_name = ' > '.join([f['name'] for f in self._phase_stack] + [phase_name])
+        tracemalloc.reset_peak()
+        phase_frame = {'name': phase_name, 'full_name': full_name, 'profile': cProfile.Profile(), 'nested_profiles': [], 'peak_bytes': 0,
+                       'start_snapshot': tracemalloc.take_snapshot(), 'webdriver_start': self.webdriver_wait_seconds, 'idle_start': self.idle_seconds, 'started_at': time.perf_counter()}
+        self._phase_stack.append(phase_frame)
+        phase_frame['profile'].enable()
+
+    def end_phase(self):
+        if not self.enabled or not self._phase_stack: return
+        phase_frame = self._phase_stack.pop()
+        phase_frame['profile'].disable()
+        wall_seconds = time.perf_counter() - phase_frame['started_at']
+        webdriver_seconds = self.webdriver_wait_seconds - phase_frame['webdriver_start']
+        idle_seconds = self.idle_seconds - phase_frame['idle_start']
+        peak_bytes = max(phase_frame['peak_bytes'], tracemalloc.get_traced_memory()[1])
+        allocation_diff = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).compare_to(phase_frame['start_snapshot'], 'lineno')
+        self._write_phase_report(phase_frame, wall_seconds, webdriver_seconds, idle_seconds, peak_bytes, allocation_diff)
+
+        if self._phase_stack:
+            parent_frame = self._phase_stack[-1]
+            parent_frame['nested_profiles'].extend([phase_frame['profile']] + phase_frame['nested_profiles'])
+            parent_frame['peak_bytes'] = max(parent_frame['peak_bytes'], peak_bytes)
+            tracemalloc.reset_peak()
+            parent_frame['profile'].enable()
+        else:
+            WebDriverWait.until = self._original_wait_until
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, phase_name):
+        self.start_phase(phase_name)
+        try: yield
+        finally: self.end_phase()
+
+    def _write_phase_report(self, phase_frame, wall_seconds, webdriver_seconds, idle_seconds, peak_bytes, allocation_diff):
+        self._phase_counter += 1
+        file_stem = os.path.join(self._run_dir, f"{self._phase_counter:02d}_{re.sub(r'[^a-z0-9]+', '_', phase_frame['full_name'].lower()).strip('_')}")
+        local_compute_seconds = max(wall_seconds - webdriver_seconds - idle_seconds, 0.0)
+        try:
+            stats = pstats.Stats(phase_frame['profile'])
+            for nested_profile in phase_frame['nested_profiles']: stats.add(nested_profile)
+            stats.dump_stats(file_stem + '.prof')
+            stats_text = io.StringIO(); stats.stream = stats_text; stats.sort_stats('cumulative').print_stats(40)
+            with open(file_stem + '.txt', 'w', encoding='utf-8') as report_file:
+                report_file.write(f"Phase: {phase_frame['full_name']}\n")
+                report_file.write(f"Wall time: {wall_seconds:.3f}s | Waiting on WebDriver: {webdriver_seconds:.3f}s | Idle/cooldown: {idle_seconds:.3f}s | Local compute: {local_compute_seconds:.3f}s\n")
+                report_file.write(f"tracemalloc peak: {peak_bytes / 1024 / 1024:.2f} MiB\n\n--- Top 15 allocation changes (by line) ---\n")
+                for allocation_stat in allocation_diff[:15]: report_file.write(f"{allocation_stat}\n")
+                report_file.write(f"\n--- cProfile (top 40 by cumulative time) ---\n{stats_text.getvalue()}")
+        except Exception as e: logger.warning(f"Profiling: Could not write report for phase '{phase_frame['full_name']}': {e}")
+
+        self._summary_rows.append({'phase': phase_frame['full_name'], 'wall_seconds': round(wall_seconds, 3), 'webdriver_wait_seconds': round(webdriver_seconds, 3), 'idle_seconds': round(idle_seconds, 3),
+                                   'local_compute_seconds': round(local_compute_seconds, 3), 'tracemalloc_peak_mib': round(peak_bytes / 1024 / 1024, 2)})
+        pd.DataFrame(self._summary_rows).to_csv(os.path.join(self._run_dir, 'phase_summary.csv'), index=False)
+        logger.info(f"Profiling: '{phase_frame['full_name']}' took {wall_seconds:.2f}s (WebDriver {webdriver_seconds:.2f}s, idle {idle_seconds:.2f}s, local {local_compute_seconds:.2f}s), peak {peak_bytes / 1024 / 1024:.1f} MiB.")
+
+profiler = PhaseProfiler(PROFILING_OUTPUT_DIR, enabled=ENABLE_PROFILING)
 
 def handle_popups(driver):
-    """Checks for and closes known popups that can interfere with clicks."""
+    """Checks for and closes known popups that can interfere with clicks. Generator (tab scheduler): call with 'yield from'; returns True if one was closed."""
     logger.debug("Popup Handler: Checking for known popups...")
     try:
         # Check for InMoment feedback survey close button
         close_button_selector = "div#imClose > button"
-        close_button = WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.CSS_SELECTOR, close_button_selector)))
+        close_button = yield from _poll_until(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, close_button_selector)), 3)
         logger.info("Popup Handler: Found and closing feedback survey popup.")
-        driver.execute_script("arguments[0].click();", close_button); time.sleep(1)
+        driver.execute_script("arguments[0].click();", close_button); yield from _idle(1)
         return True
     except TimeoutException:
         logger.debug("Popup Handler: No specific popups found (or timed out).")
@@ -87,35 +287,52 @@ def handle_popups(driver):
         return False
 
 # --- setup_driver  ---
-def setup_driver():
-    logger.info("Initializing Chrome WebDriver setup...")
+def setup_driver(num_tabs=1):
+    logger.info(f"Initializing Chrome WebDriver setup ({num_tabs} tab(s))...")
     options = webdriver.ChromeOptions()
     options.add_argument('--start-maximized'); options.add_argument('--log-level=3')
+    if num_tabs > 1:
+        # Background tabs must keep rendering at full speed while another tab is in front.
+        options.add_argument('--disable-background-timer-throttling'); options.add_argument('--disable-backgrounding-occluded-windows'); options.add_argument('--disable-renderer-backgrounding')
     # options.add_argument('--headless')
     options.add_argument('--disable-gpu'); options.add_argument('--no-sandbox'); options.add_argument('--disable-dev-shm-usage')
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    if CAPTURE_NETWORK_PAYLOADS:
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
     try:
         logger.debug("WebDriverManager: Installing/Locating ChromeDriver...")
         service = Service(ChromeDriverManager().install())
         driver = webdriver.Chrome(service=service, options=options)
+        first_handle = driver.current_window_handle
+        for _ in range(num_tabs - 1): driver.switch_to.new_window('tab')
+        driver.switch_to.window(first_handle)
         logger.info("WebDriver setup successful.")
-        return driver
+        return profiler.instrument_driver(driver)
     except WebDriverException as e:
         logger.critical(f"Fatal WebDriverException during WebDriver setup: {e.msg if hasattr(e, 'msg') else e}", exc_info=False)
         raise
     except Exception as e:
         logger.critical(f"Fatal generic error during WebDriver setup: {e}", exc_info=True); raise
 
+def _driver_is_alive(driver):
+    try: driver.window_handles; return True
+    except WebDriverException: return False
+
 # --- select_date_on_calendar  ---
-def select_date_on_calendar(driver, date_wait, target_date_str):
+def select_date_on_calendar(driver, date_wait, target_date_str, wait_for_spinner=True):
+    # Generator (tab scheduler): call with 'yield from'; returns True once the day is clicked.
     logger.info(f"Calendar: Selecting date: '{target_date_str}'.")
-    calendar_interaction_wait = WebDriverWait(driver, 20)
+    calendar_interaction_timeout = 20
     try:
         target_date_obj = datetime.strptime(target_date_str.split(' ')[0], "%d/%m/%Y")
         target_day, target_month_name, target_year = str(target_date_obj.day), target_date_obj.strftime("%B"), str(target_date_obj.year)
-        logger.debug("Calendar: Clicking icon."); calendar_icon = calendar_interaction_wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "calendar-image"))); calendar_icon.click()
-        calendar_widget = calendar_interaction_wait.until(EC.visibility_of_element_located((By.CLASS_NAME, "flatpickr-calendar"))); logger.debug("Calendar: Widget visible.")
-        for _ in range(36):
+        logger.debug("Calendar: Clicking icon."); calendar_icon = yield from _poll_until(driver, EC.element_to_be_clickable((By.CLASS_NAME, "calendar-image")), calendar_interaction_timeout, "Calendar icon not clickable."); calendar_icon.click()
+        calendar_widget = yield from _poll_until(driver, EC.visibility_of_element_located((By.CLASS_NAME, "flatpickr-calendar")), calendar_interaction_timeout, "Calendar widget not visible."); logger.debug("Calendar: Widget visible.")
+        # Allow as many month clicks as the widget's starting month is away from the target (at least 36), so old backfill dates are reachable.
+        max_month_clicks = 36
+        for month_click_count in itertools.count():
+            if month_click_count > max_month_clicks: logger.error(f"Calendar: Failed to navigate to {target_month_name} {target_year}."); return False
             cur_month_element = calendar_widget.find_element(By.CLASS_NAME, "cur-month")
             cur_year_element = calendar_widget.find_element(By.CSS_SELECTOR, ".numInput.cur-year")
             retries = 3
@@ -123,36 +340,32 @@ def select_date_on_calendar(driver, date_wait, target_date_str):
                 try:
                     cur_month = cur_month_element.text.strip(); cur_year = cur_year_element.get_attribute("value"); break
                 except StaleElementReferenceException:
-                    logger.debug("Calendar: Stale element for month/year, retrying..."); time.sleep(0.3)
-                    calendar_widget = calendar_interaction_wait.until(EC.visibility_of_element_located((By.CLASS_NAME, "flatpickr-calendar")))
+                    logger.debug("Calendar: Stale element for month/year, retrying..."); yield from _idle(0.3)
+                    calendar_widget = yield from _poll_until(driver, EC.visibility_of_element_located((By.CLASS_NAME, "flatpickr-calendar")), calendar_interaction_timeout, "Calendar widget not visible.")
                     cur_month_element = calendar_widget.find_element(By.CLASS_NAME, "cur-month")
                     cur_year_element = calendar_widget.find_element(By.CSS_SELECTOR, ".numInput.cur-year")
                     retries -= 1
                 if retries == 0: raise
             logger.debug(f"Calendar: Display: {cur_month} {cur_year}. Target: {target_month_name} {target_year}.")
             if cur_month == target_month_name and cur_year == target_year: logger.debug("Calendar: Correct month/year."); break
-            nav_button_class = "flatpickr-prev-month" if target_date_obj < datetime.strptime(f"1 {cur_month} {cur_year}", "%d %B %Y") else "flatpickr-next-month"
+            displayed_month_start = datetime.strptime(f"1 {cur_month} {cur_year}", "%d %B %Y")
+            if month_click_count == 0: max_month_clicks = max(36, abs((target_date_obj.year - displayed_month_start.year) * 12 + target_date_obj.month - displayed_month_start.month) + 2)
+            nav_button_class = "flatpickr-prev-month" if target_date_obj < displayed_month_start else "flatpickr-next-month"
             logger.debug(f"Calendar: Clicking '{nav_button_class}'."); calendar_widget.find_element(By.CLASS_NAME, nav_button_class).click()
-            time.sleep(0.4); calendar_widget = calendar_interaction_wait.until(EC.visibility_of_element_located((By.CLASS_NAME, "flatpickr-calendar")))
-        else: logger.error(f"Calendar: Failed to navigate to {target_month_name} {target_year}."); return False
+            yield from _idle(0.4); calendar_widget = yield from _poll_until(driver, EC.visibility_of_element_located((By.CLASS_NAME, "flatpickr-calendar")), calendar_interaction_timeout, "Calendar widget not visible.")
         day_xpath = f"//span[contains(@class, 'flatpickr-day') and not(contains(@class, 'prevMonthDay')) and not(contains(@class, 'nextMonthDay')) and normalize-space()='{target_day}']"
-        logger.debug(f"Calendar: Clicking day XPath: {day_xpath}"); calendar_interaction_wait.until(EC.element_to_be_clickable((By.XPATH, day_xpath))).click()
+        logger.debug(f"Calendar: Clicking day XPath: {day_xpath}"); (yield from _poll_until(driver, EC.element_to_be_clickable((By.XPATH, day_xpath)), calendar_interaction_timeout, f"Day '{target_day}' not clickable.")).click()
         logger.info(f"Calendar: Day '{target_day}' selected.")
+        if not wait_for_spinner: return True
         logger.debug("Calendar: Waiting for spinner post-day selection (up to 15s)...")
-        try:
-            calendar_spinner_wait = WebDriverWait(driver, 15)
-            spinner_locator = (By.CSS_SELECTOR, "img.loading[style*='display: block'], img.loading:not([style*='display: none'])")
-            calendar_spinner_wait.until(EC.visibility_of_element_located(spinner_locator))
-            logger.debug("Calendar: Spinner detected. Waiting for invisibility.")
-            calendar_spinner_wait.until(EC.invisibility_of_element_located(spinner_locator))
-            logger.debug("Calendar: Date selection action complete, spinner gone.")
-        except TimeoutException: logger.warning("Calendar: Spinner NOT detected or timed out after 15s for day selection. Proceeding, main data load wait will follow.")
+        if (yield from _poll_loading_spinner(driver, 15, 15)): logger.debug("Calendar: Date selection action complete, spinner gone.")
+        else: logger.warning("Calendar: Spinner NOT detected or timed out after 15s for day selection. Proceeding, main data load wait will follow.")
         return True
     except Exception as e: logger.error(f"Calendar: Error selecting date '{target_date_str}': {e}", exc_info=True); return False
 
-# --- get_input_csv [MODIFIED] ---
-def get_input_csv():
-    """Opens a file dialog for the user to select a CSV or Excel file, then reads it into a DataFrame."""
+# --- select_input_file  ---
+def select_input_file():
+    """Opens a file dialog for the user to select a CSV or Excel file. Returns the chosen path, or None."""
     # Setup Tkinter root window
     root = Tk()
     root.withdraw() # Hide the main window
@@ -173,7 +386,53 @@ def get_input_csv():
         return None
 
     logger.info(f"User selected file: '{filename}'")
+    return filename
+
+# --- read_input_file  ---
+def _consolidate_csv_rows(header, rows, first_row_number=2):
+    """Repairs bet log rows (extra fields folded back into 'Odds', short rows padded, blank rows skipped). Returns None if there is no 'Odds' header."""
+    header_lower = [h.lower() for h in header]
+    try:
+        odds_index = header_lower.index('odds')
+    except ValueError:
+        logger.critical("CSV: 'Odds' header not found.")
+        return None
+
+    data = []
+    for i, row in enumerate(rows):
+        if not any(field.strip() for field in row): continue
+        if len(row) > len(header):
+            logger.warning(f"CSV: Row #{i+first_row_number} has extra fields. Consolidating 'Odds' column.")
+            num_extra_fields = len(row) - len(header)
+            std_fields_before_odds = row[:odds_index]
+            combined_odds_fields = row[odds_index : odds_index + 1 + num_extra_fields]
+            std_fields_after_odds = row[odds_index + 1 + num_extra_fields:]
+            combined_odds_value = ''.join(combined_odds_fields)
+            processed_row = std_fields_before_odds + [combined_odds_value] + std_fields_after_odds
+            if len(processed_row) == len(header): data.append(processed_row)
+            else: logger.error(f"CSV: Row #{i+first_row_number} consolidation failed. Skipping."); continue
+        elif len(row) == len(header): data.append(row)
+        else:
+            padded_row = row + [''] * (len(header) - len(row)); data.append(padded_row)
+    return data
+
+def _finalise_input_df(df):
+    """Normalises input column names and checks the required columns are present. Returns None if any are missing."""
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    if 'time' not in df.columns and 'date' in df.columns:
+        logger.debug("Renaming 'date' column to 'time'.")
+        df.rename(columns={'date': 'time'}, inplace=True)
     
+    req_cols = ['time', 'venue', 'code', 'raceno', 'runnerno', 'runnername']
+    missing_cols = [c for c in req_cols if c not in df.columns]
+    if missing_cols:
+        logger.critical(f"Input file is missing required columns: {missing_cols}. Found columns: {df.columns.tolist()}")
+        return None
+    return df
+
+def read_input_file(filename):
+    """Reads a CSV or Excel input file into a DataFrame."""
+    if not filename: return None
     df = None
     try:
         # Determine the file type and read accordingly
@@ -183,33 +442,12 @@ def get_input_csv():
         if extension == '.csv':
             logger.info("Reading as CSV file...")
             # Using original robust CSV reading logic
-            data = []
             with open(filename, mode='r', encoding='utf-8-sig') as infile:
                 reader = csv.reader(infile)
                 header = [h.strip() for h in next(reader)]
                 logger.debug(f"CSV: Header: {header}")
-                header_lower = [h.lower() for h in header]
-                try:
-                    odds_index = header_lower.index('odds')
-                except ValueError:
-                    logger.critical("CSV: 'Odds' header not found.")
-                    return None
-                
-                for i, row in enumerate(reader):
-                    if not any(field.strip() for field in row): continue
-                    if len(row) > len(header):
-                        logger.warning(f"CSV: Row #{i+2} has extra fields. Consolidating 'Odds' column.")
-                        num_extra_fields = len(row) - len(header)
-                        std_fields_before_odds = row[:odds_index]
-                        combined_odds_fields = row[odds_index : odds_index + 1 + num_extra_fields]
-                        std_fields_after_odds = row[odds_index + 1 + num_extra_fields:]
-                        combined_odds_value = ''.join(combined_odds_fields)
-                        processed_row = std_fields_before_odds + [combined_odds_value] + std_fields_after_odds
-                        if len(processed_row) == len(header): data.append(processed_row)
-                        else: logger.error(f"CSV: Row #{i+2} consolidation failed. Skipping."); continue
-                    elif len(row) == len(header): data.append(row)
-                    else:
-                        padded_row = row + [''] * (len(header) - len(row)); data.append(padded_row)
+                data = _consolidate_csv_rows(header, reader)
+                if data is None: return None
             df = pd.DataFrame(data, columns=header)
         
         elif extension in ['.xlsx', '.xls']:
@@ -225,16 +463,8 @@ def get_input_csv():
             logger.warning("File was read but is empty after processing.")
             return None
 
-        df.columns = [str(c).strip().lower() for c in df.columns]
-        if 'time' not in df.columns and 'date' in df.columns:
-            logger.debug("Renaming 'date' column to 'time'.")
-            df.rename(columns={'date': 'time'}, inplace=True)
-        
-        req_cols = ['time', 'venue', 'code', 'raceno', 'runnerno', 'runnername']
-        missing_cols = [c for c in req_cols if c not in df.columns]
-        if missing_cols:
-            logger.critical(f"Input file is missing required columns: {missing_cols}. Found columns: {df.columns.tolist()}")
-            return None
+        df = _finalise_input_df(df)
+        if df is None: return None
         
         logger.info(f"Successfully loaded {len(df)} tasks from the selected file.")
         return df
@@ -243,19 +473,26 @@ def get_input_csv():
         logger.critical(f"Failed to read or process file '{filename}': {e}", exc_info=True)
         return None
 
+# --- get_input_csv [MODIFIED] ---
+def get_input_csv():
+    """Opens a file dialog for the user to select a CSV or Excel file, then reads it into a DataFrame."""
+    return read_input_file(select_input_file())
+
+# --- _robust_to_datetime  ---
+def _robust_to_datetime(time_val):
+    if pd.isna(time_val) or str(time_val).strip() == '': return pd.NaT
+    for fmt in ('%d/%m/%Y %H:%M', '%m/%d/%Y %H:%M', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d'):
+        try: return pd.to_datetime(time_val, format=fmt, errors='raise')
+        except (ValueError, TypeError): continue
+    try: return pd.to_datetime(time_val, errors='coerce')
+    except Exception: return pd.NaT
+
 # --- filter_tasks_for_last_n_days  ---
 def filter_tasks_for_last_n_days(df_input, days=8):
     if df_input is None or df_input.empty: logger.info("Date Filter: Input DataFrame is empty or None."); return df_input
     logger.info(f"Date Filter: Starting to filter tasks for the last {days} days (today inclusive).")
     df = df_input.copy()
-    def robust_to_datetime(time_val):
-        if pd.isna(time_val) or str(time_val).strip() == '': return pd.NaT
-        for fmt in ('%d/%m/%Y %H:%M', '%m/%d/%Y %H:%M', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d'):
-            try: return pd.to_datetime(time_val, format=fmt, errors='raise')
-            except (ValueError, TypeError): continue
-        try: return pd.to_datetime(time_val, errors='coerce')
-        except Exception: return pd.NaT
-    df['temp_parsed_datetime'] = df['time'].apply(robust_to_datetime)
+    df['temp_parsed_datetime'] = df['time'].apply(_robust_to_datetime)
     original_count = len(df); df.dropna(subset=['temp_parsed_datetime'], inplace=True)
     dropped_for_unparseable = original_count - len(df)
     if dropped_for_unparseable > 0: logger.warning(f"Date Filter: Dropped {dropped_for_unparseable} tasks due to unparseable 'time' field.")
@@ -273,8 +510,366 @@ def filter_tasks_for_last_n_days(df_input, days=8):
     df_filtered.drop(columns=['temp_parsed_datetime'], inplace=True, errors='ignore')
     return df_filtered
 
+# --- filter_tasks_for_date_range  ---
+def filter_tasks_for_date_range(df_input, start_date_str, end_date_str=None):
+    """Keeps tasks whose 'time' falls within [start_date_str, end_date_str] (both 'dd/mm/YYYY', inclusive; end defaults to today)."""
+    if df_input is None or df_input.empty: logger.info("Date Range Filter: Input DataFrame is empty or None."); return df_input
+    start_date = datetime.strptime(start_date_str, "%d/%m/%Y").date()
+    end_date = datetime.strptime(end_date_str, "%d/%m/%Y").date() if end_date_str else datetime.now().date()
+    logger.info(f"Date Range Filter: Applying date range: >= {start_date.strftime('%d/%m/%Y')} and <= {end_date.strftime('%d/%m/%Y')}.")
+    df = df_input.copy()
+    df['temp_parsed_datetime'] = df['time'].apply(_robust_to_datetime)
+    original_count = len(df); df.dropna(subset=['temp_parsed_datetime'], inplace=True)
+    dropped_for_unparseable = original_count - len(df)
+    if dropped_for_unparseable > 0: logger.warning(f"Date Range Filter: Dropped {dropped_for_unparseable} tasks due to unparseable 'time' field.")
+    df_filtered = df[(df['temp_parsed_datetime'].dt.date >= start_date) & (df['temp_parsed_datetime'].dt.date <= end_date)].copy()
+    tasks_dropped_by_range = len(df) - len(df_filtered)
+    if tasks_dropped_by_range > 0: logger.info(f"Date Range Filter: {tasks_dropped_by_range} tasks were outside the range and removed.")
+    logger.info(f"Date Range Filter: {len(df_filtered)} tasks remain after date range filtering.")
+    df_filtered.drop(columns=['temp_parsed_datetime'], inplace=True, errors='ignore')
+    return df_filtered
+
+# --- validate_backfill_range  ---
+def validate_backfill_range(start_date_str, end_date_str=None):
+    """Checks BACKFILL_START_DATE/BACKFILL_END_DATE are 'dd/mm/YYYY' dates in order and not in the future. Logs and returns False otherwise."""
+    try:
+        start_date = datetime.strptime(str(start_date_str).strip(), "%d/%m/%Y").date()
+        end_date = datetime.strptime(str(end_date_str).strip(), "%d/%m/%Y").date() if end_date_str else datetime.now().date()
+    except ValueError as e:
+        logger.critical(f"Backfill: Invalid date range '{start_date_str}' to '{end_date_str}' (expected dd/mm/YYYY): {e}"); return False
+    if start_date > end_date: logger.critical(f"Backfill: Start date {start_date_str} is after end date {end_date_str or 'today'}."); return False
+    if end_date > datetime.now().date(): logger.critical(f"Backfill: End date {end_date_str} is in the future."); return False
+    return True
+
+# --- BackfillProgressTracker  ---
+class BackfillProgressTracker:
+    """
+    Collects observed scrape time per date during a backfill and logs progress with an ETA.
+    The ETA uses the median seconds-per-task across completed dates, so a single date stuck on
+    a data-load timeout does not dominate the estimate, divided by the number of tabs working in parallel.
+    """
+    def __init__(self, total_tasks, total_dates, parallel_workers=1):
+        self.total_tasks = total_tasks; self.total_dates = total_dates; self.parallel_workers = max(parallel_workers, 1)
+        self.completed_tasks = 0; self.completed_dates = 0
+        self.seconds_per_task_by_date = {}
+        self.started_at = time.monotonic()
+
+    def date_completed(self, date_str, task_count, elapsed_seconds):
+        self.completed_tasks += task_count; self.completed_dates += 1
+        if task_count: self.seconds_per_task_by_date[date_str] = elapsed_seconds / task_count
+        remaining_tasks = max(self.total_tasks - self.completed_tasks, 0)
+        observed_rates = list(self.seconds_per_task_by_date.values())
+        eta_str = str(timedelta(seconds=int(statistics.median(observed_rates) * remaining_tasks / self.parallel_workers))) if observed_rates else 'unknown'
+        elapsed_total_str = str(timedelta(seconds=int(time.monotonic() - self.started_at)))
+        logger.info(f"Backfill Progress: {self.completed_dates}/{self.total_dates} dates, {self.completed_tasks}/{self.total_tasks} tasks done "
+                    f"(date {date_str}: {task_count} tasks in {elapsed_seconds:.1f}s). Elapsed: {elapsed_total_str}, ETA: {eta_str}.")
+
+# --- _get_date_only_str  ---
+def _get_date_only_str(time_val):
+    """Normalises a raw 'time' value to the 'dd/mm/YYYY' date string used for grouping and calendar selection."""
+    if pd.isna(time_val) or str(time_val).strip() == '': return None
+    for fmt in ('%d/%m/%Y %H:%M', '%m/%d/%Y %H:%M', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try: return pd.to_datetime(time_val, format=fmt).strftime('%d/%m/%Y')
+        except (ValueError, TypeError): continue
+    dt_obj = pd.to_datetime(time_val, errors='coerce'); return dt_obj.strftime('%d/%m/%Y') if pd.notna(dt_obj) else None
+
+# --- Page snapshot store helpers  ---
+def _snapshot_path(snapshot_dir, date_str, code, venue, raceno):
+    """Builds the store path for one (date, code, venue, raceno) race snapshot."""
+    date_folder = datetime.strptime(date_str, "%d/%m/%Y").strftime("%Y-%m-%d")
+    code_folder = CODE_TO_ID_MAP.get(str(code).strip().lower(), str(code).strip().lower())
+    venue_slug = re.sub(r'[^a-z0-9]+', '_', str(venue).strip().lower()).strip('_')
+    return os.path.join(snapshot_dir, date_folder, code_folder, f"{venue_slug}_R{str(raceno).strip()}.html.gz")
+
+def _save_race_snapshot(html_content, date_str, code, venue, raceno, snapshot_dir=SNAPSHOT_STORE_DIR):
+    """Writes the rendered runners panel HTML for a race into the compressed snapshot store."""
+    try:
+        snapshot_file = _snapshot_path(snapshot_dir, date_str, code, venue, raceno)
+        os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+        temp_file = snapshot_file + '.tmp'
+        with gzip.open(temp_file, 'wt', encoding='utf-8') as outfile: outfile.write(html_content)
+        os.replace(temp_file, snapshot_file)
+        logger.debug(f"Snapshot: Saved R{raceno} ({venue}) for {date_str} to '{snapshot_file}'.")
+    except Exception as e: logger.warning(f"Snapshot: Could not save R{raceno} ({venue}) for {date_str}: {e}")
+
+class _RunnersSnapshotParser(HTMLParser):
+    """Reads runner number and BSP win/place prices out of a saved runners panel, mirroring the live DOM selectors."""
+    def __init__(self):
+        super().__init__()
+        self.prices_by_runner_no = {}
+        self._div_depth = 0; self._runner_depth = None; self._capture = None; self._current_runner = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'div': return
+        self._div_depth += 1
+        classes = (dict(attrs).get('class') or '').split()
+        if self._runner_depth is None:
+            if classes == ['runner']: self._runner_depth = self._div_depth; self._current_runner = {'number': '', 'win': '', 'place': ''}
+            return
+        if self._capture: return
+        if classes == ['number'] and not self._current_runner['number']: self._capture = ('number', self._div_depth)
+        elif 'price' in classes and 'win' in classes: self._capture = ('win', self._div_depth)
+        elif 'price' in classes and 'place' in classes: self._capture = ('place', self._div_depth)
+
+    def handle_endtag(self, tag):
+        if tag != 'div': return
+        if self._capture and self._capture[1] == self._div_depth: self._capture = None
+        if self._runner_depth == self._div_depth:
+            runner_no = ' '.join(self._current_runner['number'].split())
+            if runner_no and runner_no not in self.prices_by_runner_no:
+                self.prices_by_runner_no[runner_no] = (' '.join(self._current_runner['win'].split()), ' '.join(self._current_runner['place'].split()))
+            self._runner_depth = None; self._current_runner = None
+        self._div_depth -= 1
+
+    def handle_data(self, data):
+        if self._capture: self._current_runner[self._capture[0]] += data
+
+def _parse_race_snapshot_file(snapshot_file):
+    """Returns {runner_no: (win, place)} for a stored race snapshot, or None if it is missing/unreadable. Runs in worker processes."""
+    if not os.path.exists(snapshot_file): return None
+    try:
+        with gzip.open(snapshot_file, 'rt', encoding='utf-8') as infile: html_content = infile.read()
+    except (OSError, EOFError, zlib.error, ValueError): return None  # ValueError covers UnicodeDecodeError
+    parser = _RunnersSnapshotParser(); parser.feed(html_content); parser.close()
+    return parser.prices_by_runner_no
+
+# --- extract_bsp_from_snapshots  ---
+def extract_bsp_from_snapshots(tasks_df_input, snapshot_dir=SNAPSHOT_STORE_DIR, max_workers=None):
+    """
+    Rebuilds BSP results for the given tasks purely from the local snapshot store (no WebDriver).
+    Snapshots are decompressed and parsed in parallel worker processes, one per (date, code, venue, raceno).
+    """
+    logger.info(f"[Offline] Re-extracting BSP for {len(tasks_df_input)} tasks from snapshot store '{snapshot_dir}'.")
+    if tasks_df_input.empty: logger.warning("[Offline] Input DataFrame is empty."); return pd.DataFrame()
+    tasks_df = tasks_df_input.copy()
+    tasks_df['date_only'] = tasks_df['time'].apply(_get_date_only_str)
+    enriched_rows_collector_list = []
+    for _, task_series in tasks_df[tasks_df['date_only'].isna()].iterrows():
+        task_copy = task_series.copy(); task_copy['BSP Price Win'], task_copy['BSP Price Place'] = 'Date Parse Error For Grouping', 'Date Parse Error For Grouping'; enriched_rows_collector_list.append(task_copy)
+
+    race_groups = tasks_df.dropna(subset=['date_only']).groupby(['date_only', 'code', 'venue', 'raceno'], sort=False)
+    race_keys = list(race_groups.groups.keys())
+    snapshot_files = [_snapshot_path(snapshot_dir, *race_key) for race_key in race_keys]
+    logger.info(f"[Offline] Parsing {len(snapshot_files)} race snapshot(s) with up to {max_workers or os.cpu_count()} worker process(es).")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        parsed_snapshots = dict(zip(race_keys, executor.map(_parse_race_snapshot_file, snapshot_files, chunksize=16)))
+
+    missing_snapshots_count = 0
+    for race_key, race_tasks_df in race_groups:
+        prices_by_runner_no = parsed_snapshots.get(race_key)
+        if prices_by_runner_no is None:
+            missing_snapshots_count += 1
+            logger.debug(f"[Offline] No snapshot for {race_key}.")
+        for _, task_series in race_tasks_df.iterrows():
+            task_copy = task_series.copy()
+            if prices_by_runner_no is None: task_copy['BSP Price Win'], task_copy['BSP Price Place'] = 'Snapshot Not Found', 'Snapshot Not Found'
+            elif str(task_copy['runnerno']).strip() not in prices_by_runner_no: task_copy['BSP Price Win'], task_copy['BSP Price Place'] = 'Runner Not Found on Page', 'Runner Not Found on Page'
+            else:
+                win_price_text, place_price_text = prices_by_runner_no[str(task_copy['runnerno']).strip()]
+                task_copy['BSP Price Win'], task_copy['BSP Price Place'] = win_price_text or "N/A", place_price_text or "N/A"
+            enriched_rows_collector_list.append(task_copy)
+
+    if missing_snapshots_count: logger.warning(f"[Offline] {missing_snapshots_count}/{len(race_keys)} race(s) had no stored snapshot.")
+    enriched_df = pd.DataFrame(enriched_rows_collector_list)
+    enriched_df = enriched_df[tasks_df_input.columns.tolist() + ['BSP Price Win', 'BSP Price Place']]
+    logger.info(f"[Offline] Finished. Returning {len(enriched_df)} processed rows.")
+    return enriched_df
+
+# --- Cooperative waits for the tab scheduler  ---
+def _poll_until(driver, condition, timeout, timeout_message="", raise_on_timeout=True, ignored_exceptions=(NoSuchElementException, StaleElementReferenceException)):
+    """
+    Generator counterpart of WebDriverWait(driver, timeout).until(condition): checks once per scheduler turn and
+    yields in between so other tabs can progress. Use with 'yield from'; returns the condition's value.
+    Conditions on an already-located element should not ignore StaleElementReferenceException, as it cannot recover.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try: result = condition(driver)
+        except ignored_exceptions: result = False
+        if result: return result
+        if time.monotonic() >= deadline:
+            if raise_on_timeout: raise TimeoutException(timeout_message or f"Condition not met within {timeout}s.")
+            return None
+        yield
+
+def _idle(seconds, page_settle=True):
+    """
+    Generator counterpart of time.sleep(seconds) that lets other tabs run meanwhile. Yields (resume time, page_settle) so the
+    scheduler can skip the tab until then and knows whether it is waiting on the page (a settle pause) or merely idle (a
+    retry backoff). Always yields at least once, so a zero wait still hands the turn to the other tabs.
+    """
+    resume_at = time.monotonic() + seconds
+    yield resume_at, page_settle
+    while time.monotonic() < resume_at: yield resume_at, page_settle
+
+def _poll_loading_spinner(driver, appear_timeout, disappear_timeout):
+    """Waits for the page's loading spinner to appear and then clear. Returns False if it never appeared or did not clear in time."""
+    spinner_locator = (By.CSS_SELECTOR, "img.loading[style*='display: block'], img.loading:not([style*='display: none'])")
+    if (yield from _poll_until(driver, EC.visibility_of_element_located(spinner_locator), appear_timeout, raise_on_timeout=False)) is None: return False
+    return (yield from _poll_until(driver, EC.invisibility_of_element_located(spinner_locator), disappear_timeout, raise_on_timeout=False)) is not None
+
+class _TabState:
+    """Per-tab page state: what the tab's page currently shows, the date it is working towards and its log label."""
+    def __init__(self, tab_index, window_handle, log_label):
+        self.tab_index = tab_index; self.window_handle = window_handle; self.log_label = log_label
+        self.cur_date_on_page, self.cur_code_on_page, self.cur_venue_on_page = None, None, None
+        self.active_meeting_el_on_page = None; self.venue_failures_on_current_date_count = 0
+        self.target_date = None; self.log_date = 'Setup'
+
+def _run_tab_scheduler(driver, tab_workers, context_filter):
+    """
+    Round-robins generator-based tab workers inside one browser. Each worker runs until its next cooperative
+    wait; the scheduler then switches to the next tab's window handle (only when it differs) and resumes it.
+    Tabs that are pausing (they yield a resume time) are skipped without switching until that time. The pause between
+    rounds counts as waiting on WebDriver while any tab is polling or settling the page, and as idle only when every
+    remaining tab is sitting out a retry backoff.
+    """
+    active_workers = list(tab_workers); current_handle = driver.current_window_handle
+    resume_at_by_tab = {}; waiting_on_page_by_tab = {}
+    while active_workers:
+        for tab, worker in list(active_workers):
+            if time.monotonic() < resume_at_by_tab.get(tab.tab_index, 0): continue
+            if tab.window_handle != current_handle: driver.switch_to.window(tab.window_handle); current_handle = tab.window_handle
+            context_filter.current_date = tab.log_date
+            try: resume_at_by_tab[tab.tab_index], waiting_on_page_by_tab[tab.tab_index] = next(worker) or (0, True)
+            except StopIteration: active_workers.remove((tab, worker))
+        if not active_workers: break
+        if any(waiting_on_page_by_tab[tab.tab_index] for tab, _ in active_workers): profiler.page_settle(TAB_POLL_INTERVAL_SECONDS)
+        else: profiler.idle_sleep(TAB_POLL_INTERVAL_SECONDS)
+
+# --- Network payload capture  ---
+# The feed's schema is not published, so fields are matched by normalised key name (lowercase, alphanumerics only).
+_PAYLOAD_VENUE_KEYS = {'venue', 'venuename', 'meetingname', 'track', 'trackname', 'course', 'coursename'}
+_PAYLOAD_RACE_NO_KEYS = {'raceno', 'racenumber', 'racenum'}
+_PAYLOAD_DATE_KEYS = {'date', 'meetingdate', 'racedate', 'racingdate'}
+_PAYLOAD_CODE_KEYS = {'code', 'racetype', 'racingcode', 'racingtype', 'eventtype', 'category'}
+_PAYLOAD_RUNNER_NO_KEYS = {'runnerno', 'runnernumber', 'number', 'saddlecloth', 'saddleclothnumber', 'clothnumber', 'tabnumber'}
+# Only BSP-specific price keys: plain 'win'/'place'/'winprice' can equally be fixed-odds, tote or result fields.
+_PAYLOAD_WIN_BSP_KEYS = {'bspwin', 'winbsp', 'bspwinprice', 'winbspprice'}
+_PAYLOAD_PLACE_BSP_KEYS = {'bspplace', 'placebsp', 'bspplaceprice', 'placebspprice'}
+
+def _normalise_payload_key(key):
+    return re.sub(r'[^a-z0-9]', '', str(key).lower())
+
+def _payload_code_id(code_value):
+    """Maps a payload's race code value ('Greyhound Racing', 'H', ...) to the page's code id, or None."""
+    code_text = str(code_value).strip().lower()
+    if code_text in CODE_TO_ID_MAP: return CODE_TO_ID_MAP[code_text]
+    return next((code_id for code_id in set(CODE_TO_ID_MAP.values()) if code_id in code_text), None)
+
+def _payload_price_text(price_value):
+    """Formats a payload price like the rendered page ('3.45'). Returns None unless it is a number above 1.0, so the race falls back to the DOM."""
+    if price_value is None or isinstance(price_value, bool): return None
+    try: price = float(price_value)
+    except (TypeError, ValueError): return None
+    return f"{price:.2f}" if price > 1.0 else None
+
+def _payload_date_str(date_value):
+    """Returns the 'dd/mm/YYYY' date of a payload date or timestamp. Zoned timestamps are converted to PAYLOAD_RACE_TIMEZONE first, so a UTC start time is not filed under the previous day."""
+    date_text = str(date_value).strip()
+    if re.match(r'\d{4}-\d{2}-\d{2}T', date_text):
+        timestamp = pd.to_datetime(date_text, errors='coerce')
+        if pd.isna(timestamp): return None
+        if timestamp.tzinfo is not None: timestamp = timestamp.tz_convert(PAYLOAD_RACE_TIMEZONE)
+        return timestamp.strftime('%d/%m/%Y')
+    return _get_date_only_str(date_text)
+
+def _extract_bsp_tables_from_payload(payload, fallback_date_str=None):
+    """
+    Walks a decoded JSON payload and returns {(date_str, code_id or None, venue_key, raceno): {runner_no: (win, place)}}.
+    A runner is any object carrying a runner number and valid BSP win and place prices; venue, race number, date and code are inherited
+    from enclosing objects. Payloads without their own date use fallback_date_str (the date shown in the tab).
+    """
+    bsp_tables = {}
+    def walk(node, context):
+        if isinstance(node, list):
+            for child in node: walk(child, context)
+            return
+        if not isinstance(node, dict): return
+        scalar_fields = {_normalise_payload_key(k): v for k, v in node.items() if not isinstance(v, (dict, list))}
+        runner_no_key = next((k for k in _PAYLOAD_RUNNER_NO_KEYS if scalar_fields.get(k) not in (None, '')), None)
+        win_key = next((k for k in _PAYLOAD_WIN_BSP_KEYS if k in scalar_fields), None)
+        if runner_no_key and win_key and context.get('venue') and context.get('raceno'):
+            place_key = next((k for k in _PAYLOAD_PLACE_BSP_KEYS if k in scalar_fields), None)
+            win_price_text, place_price_text = _payload_price_text(scalar_fields[win_key]), _payload_price_text(scalar_fields.get(place_key))
+            date_str = context.get('date') or fallback_date_str
+            # Runners without two valid BSP prices are left out, so the DOM is read for them.
+            if date_str and win_price_text and place_price_text:
+                race_key = (date_str, context.get('code'), context['venue'], context['raceno'])
+                bsp_tables.setdefault(race_key, {}).setdefault(str(scalar_fields[runner_no_key]).strip(), (win_price_text, place_price_text))
+            return
+        child_context = dict(context)
+        for field_key, field_value in scalar_fields.items():
+            if field_value in (None, ''): continue
+            if field_key in _PAYLOAD_VENUE_KEYS: child_context['venue'] = ' '.join(str(field_value).lower().split())
+            elif field_key in _PAYLOAD_RACE_NO_KEYS and str(field_value).strip().isdigit(): child_context['raceno'] = str(int(str(field_value).strip()))
+            elif field_key in _PAYLOAD_DATE_KEYS: child_context['date'] = _payload_date_str(field_value) or child_context.get('date')
+            elif field_key in _PAYLOAD_CODE_KEYS: child_context['code'] = _payload_code_id(field_value) or child_context.get('code')
+        for child in node.values():
+            if isinstance(child, (dict, list)): walk(child, child_context)
+    walk(payload, {})
+    return bsp_tables
+
+class _NetworkPayloadCollector:
+    """
+    Reads Chrome's performance log for finished JSON responses and keeps the BSP tables parsed from them.
+    Response bodies can only be fetched through the tab (DevTools target) that loaded them, so each tab
+    drains its own responses while its window handle is active; the log itself is shared by all tabs.
+    """
+    def __init__(self, window_handles):
+        self.known_targets = {self._target_id(handle) for handle in window_handles}
+        self.json_request_targets = {}; self.finished_requests_by_target = {}
+        self.bsp_tables = {}; self.payload_count = 0
+
+    @staticmethod
+    def _target_id(window_handle):
+        return str(window_handle).replace('CDwindow-', '')
+
+    def _read_performance_log(self, driver):
+        for log_entry in driver.get_log('performance'):
+            try: log_record = json.loads(log_entry['message']); message = log_record['message']
+            except (KeyError, TypeError, ValueError): continue
+            params = message.get('params', {})
+            if message.get('method') == 'Network.responseReceived' and 'json' in params.get('response', {}).get('mimeType', '').lower():
+                self.json_request_targets[params['requestId']] = log_record.get('webview')
+            elif message.get('method') == 'Network.loadingFinished' and params.get('requestId') in self.json_request_targets:
+                target_id = self.json_request_targets.pop(params['requestId'])
+                self.finished_requests_by_target.setdefault(target_id, []).append(params['requestId'])
+            elif message.get('method') == 'Network.loadingFailed': self.json_request_targets.pop(params.get('requestId'), None)
+
+    def drain(self, driver, tab):
+        """Fetches and parses the finished JSON responses of the active tab. Returns the number of race tables added or updated."""
+        try: self._read_performance_log(driver)
+        except WebDriverException as e: logger.debug(f"[{tab.log_label}] Payload capture: performance log unavailable: {e}"); return 0
+        tab_target_id = self._target_id(tab.window_handle)
+        request_ids = self.finished_requests_by_target.pop(tab_target_id, [])
+        # Entries without a recognisable target can only have come from a tab whose id format differs; try them here.
+        for target_id in [t for t in self.finished_requests_by_target if t not in self.known_targets]: request_ids.extend(self.finished_requests_by_target.pop(target_id))
+        fallback_date_str = tab.cur_date_on_page if tab.cur_date_on_page and not tab.cur_date_on_page.startswith('Error_') else None
+        race_tables_updated = 0
+        for request_id in request_ids:
+            try:
+                response_body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                body_text = response_body.get('body', '')
+                if response_body.get('base64Encoded'): body_text = base64.b64decode(body_text).decode('utf-8', errors='replace')
+                payload = json.loads(body_text)
+            except (WebDriverException, ValueError) as e: logger.debug(f"[{tab.log_label}] Payload capture: could not read response {request_id}: {e}"); continue
+            payload_tables = _extract_bsp_tables_from_payload(payload, fallback_date_str)
+            if not payload_tables: continue
+            self.payload_count += 1; race_tables_updated += len(payload_tables)
+            for race_key, prices_by_runner_no in payload_tables.items(): self.bsp_tables.setdefault(race_key, {}).update(prices_by_runner_no)
+        if race_tables_updated: logger.debug(f"[{tab.log_label}] Payload capture: {race_tables_updated} race table(s) from captured payloads ({len(self.bsp_tables)} cached).")
+        return race_tables_updated
+
+    def lookup(self, date_str, code, venue, raceno):
+        """Returns {runner_no: (win, place)} for a race seen in a payload, or None."""
+        venue_key = ' '.join(str(venue).lower().split()); raceno_key = str(raceno).strip()
+        raceno_key = str(int(raceno_key)) if raceno_key.isdigit() else raceno_key
+        return self.bsp_tables.get((date_str, CODE_TO_ID_MAP.get(str(code).lower()), venue_key, raceno_key)) or self.bsp_tables.get((date_str, None, venue_key, raceno_key))
+
 # --- _fetch_bsp_for_race_runners  ---
-def _fetch_bsp_for_race_runners(driver, wait, active_meeting_element_initial_ref, raceno_to_find, tasks_for_this_race_df, venue_name_for_logging):
+def _fetch_bsp_for_race_runners(driver, wait, active_meeting_element_initial_ref, raceno_to_find, tasks_for_this_race_df, venue_name_for_logging, date_str=None, code=None):
+    # Generator (tab scheduler): call with 'yield from'; returns the list of processed task Series.
     processed_tasks_list = []
     str_raceno = str(raceno_to_find)
     logger.info(f"Race R{str_raceno} ({venue_name_for_logging}): Processing {len(tasks_for_this_race_df)} task(s).")
@@ -293,24 +888,26 @@ def _fetch_bsp_for_race_runners(driver, wait, active_meeting_element_initial_ref
 
         tab_xpath = f".//div[contains(@class, 'race-tab') and div[@class='race-number' and normalize-space(text())='{str_raceno}']]"
         logger.debug(f"Race R{str_raceno}: Locating Tab XPath: {tab_xpath} within active meeting.")
-        tab_element = wait.until(EC.element_to_be_clickable(active_meeting_element.find_element(By.XPATH, tab_xpath)))
+        tab_element = yield from _poll_until(driver, EC.element_to_be_clickable(active_meeting_element.find_element(By.XPATH, tab_xpath)), wait._timeout, f"Race R{str_raceno} tab not clickable.", ignored_exceptions=(NoSuchElementException,))
 
         if "active-grad" not in tab_element.get_attribute("class"):
             logger.debug(f"Race R{str_raceno}: Tab not active. Clicking.")
-            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", tab_element); time.sleep(0.3)
+            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", tab_element); yield from _idle(0.3)
             driver.execute_script("arguments[0].click();", tab_element)
             runners_loaded_xpath = f".//div[@class='races']/div[contains(@class, 'betfair-url') and not(contains(@style,'display: none'))]//div[@class='runners']/div[@class='runner']"
             try:
-                WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.XPATH, runners_loaded_xpath)))
+                yield from _poll_until(driver, EC.presence_of_element_located((By.XPATH, runners_loaded_xpath)), 20)
                 logger.debug(f"Race R{str_raceno}: Runners appear to be loaded for the new tab.")
             except TimeoutException:
                 logger.warning(f"Race R{str_raceno}: Timeout (20s) waiting for runners to load after tab click. Content might be missing/slow.")
-            time.sleep(1.0)
-        else: logger.debug(f"Race R{str_raceno}: Tab already active."); time.sleep(0.5)
+            yield from _idle(1.0)
+        else: logger.debug(f"Race R{str_raceno}: Tab already active."); yield from _idle(0.5)
 
         runners_container_xpath = f".//div[@class='races']/div[contains(@class, 'betfair-url') and not(contains(@style,'display: none'))]//div[@class='runners']"
         logger.debug(f"Race R{str_raceno}: Locating runners container XPath: {runners_container_xpath}")
-        runners_container = wait.until(EC.visibility_of(active_meeting_element.find_element(By.XPATH, runners_container_xpath)))
+        runners_container = yield from _poll_until(driver, EC.visibility_of(active_meeting_element.find_element(By.XPATH, runners_container_xpath)), wait._timeout, f"Race R{str_raceno} runners not visible.", ignored_exceptions=(NoSuchElementException,))
+        if SAVE_PAGE_SNAPSHOTS and date_str and code:
+            _save_race_snapshot(runners_container.get_attribute("outerHTML"), date_str, code, venue_name_for_logging, str_raceno)
 
         for _, task_series in tasks_for_this_race_df.iterrows():
             task_copy = task_series.copy()
@@ -348,10 +945,11 @@ def _find_and_click_venue(driver, wait, csv_venue_group, current_phase_name, fuz
     Finds and clicks a venue filter button on the page.
     It first attempts an exact match. If that fails and fuzzy matching is enabled,
     it will attempt to find a single, unambiguous partial match.
+    Generator (tab scheduler): call with 'yield from'; returns True once a venue is clicked.
     """
     venue_filters_css = "div.filters-list div.filter:not([style*='display: none'])"
     try:
-        wait.until(EC.visibility_of_any_elements_located((By.CSS_SELECTOR, venue_filters_css)))
+        yield from _poll_until(driver, EC.visibility_of_any_elements_located((By.CSS_SELECTOR, venue_filters_css)), wait._timeout)
         visible_venue_filters = driver.find_elements(By.CSS_SELECTOR, venue_filters_css)
         logger.debug(f"[{current_phase_name}] Found {len(visible_venue_filters)} venue filters. Searching for '{csv_venue_group}'.")
     except TimeoutException:
@@ -365,7 +963,7 @@ def _find_and_click_venue(driver, wait, csv_venue_group, current_phase_name, fuz
             if el_text.lower() == csv_venue_group.lower():
                 logger.debug(f"[{current_phase_name}] Exact venue match for '{el_text}' found. Clicking.")
                 driver.execute_script("arguments[0].scrollIntoView({block:'center'});", venue_filter_el)
-                time.sleep(0.5)
+                yield from _idle(0.5)
                 venue_filter_el.click()
                 return True # Success
         except StaleElementReferenceException:
@@ -397,7 +995,7 @@ def _find_and_click_venue(driver, wait, csv_venue_group, current_phase_name, fuz
             matched_name, matched_element = potential_fuzzy_matches[0]
             logger.warning(f"[{current_phase_name}] Found unique fuzzy match for '{csv_venue_group}': '{matched_name}'. Using it.")
             driver.execute_script("arguments[0].scrollIntoView({block:'center'});", matched_element)
-            time.sleep(0.5)
+            yield from _idle(0.5)
             matched_element.click()
             return True # Success
         elif len(potential_fuzzy_matches) > 1:
@@ -412,12 +1010,78 @@ def _find_and_click_venue(driver, wait, csv_venue_group, current_phase_name, fuz
     logger.error(f"[{current_phase_name}] Venue '{csv_venue_group}' NOT FOUND (Exact match failed, fuzzy matching disabled/failed).")
     return False
 
+# --- _ScrapeWorkQueue  ---
+class _ScrapeWorkQueue:
+    """
+    Work queue for one scraping session, shared by all tabs: fresh [Date, Code, Venue] groups bucketed by date
+    (dates in input order) plus pending retries. A tab is served, in order: ready retries for the date it is on
+    (same code first), fresh groups for that date, a wait for that date's remaining retry backoff, fresh groups
+    of a date no other tab is on, and finally any other work. This keeps calendar navigation local to each tab.
+    """
+    def __init__(self, grouped_tasks_iter):
+        self.fresh_items_by_date = {}
+        for group_key, group_df in grouped_tasks_iter:
+            self.fresh_items_by_date.setdefault(group_key[0], deque()).append({'key': group_key, 'tasks_df': group_df, 'attempt': 1})
+        self.retry_items = []
+        self._sequence = itertools.count()
+
+    def push_retry(self, group_key, tasks_df, attempt, reason):
+        backoff_seconds = RETRY_BACKOFF_BASE_SECONDS * (2 ** (attempt - 2))
+        self.retry_items.append({'key': group_key, 'tasks_df': tasks_df, 'attempt': attempt, 'reason': reason,
+                                 'ready_at': time.monotonic() + backoff_seconds, 'sequence': next(self._sequence)})
+        return backoff_seconds
+
+    def drain_retries(self):
+        pending_retries, self.retry_items = self.retry_items, []
+        return pending_retries
+
+    def take_date_items(self, date_str):
+        """Removes and returns every queued item (fresh or retry) for date_str."""
+        date_items = list(self.fresh_items_by_date.pop(date_str, ()))
+        date_items.extend(item for item in self.retry_items if item['key'][0] == date_str)
+        self.retry_items = [item for item in self.retry_items if item['key'][0] != date_str]
+        return date_items
+
+    def _pop_fresh(self, date_str):
+        date_items = self.fresh_items_by_date[date_str]; chosen_item = date_items.popleft()
+        if not date_items: del self.fresh_items_by_date[date_str]
+        return chosen_item
+
+    def next_item(self, cur_date_on_page, cur_code_on_page, other_tab_dates=()):
+        """Returns (item, None) to process next, (None, seconds) to wait for a backoff, or (None, None) when done."""
+        now = time.monotonic()
+        def retry_priority(item):
+            same_code = CODE_TO_ID_MAP.get(str(item['key'][1]).lower()) == cur_code_on_page
+            return (0 if same_code else 1, item['ready_at'], item['sequence'])
+        same_date_retries = [item for item in self.retry_items if item['key'][0] == cur_date_on_page]
+        ready_same_date_retries = [item for item in same_date_retries if item['ready_at'] <= now]
+        if ready_same_date_retries:
+            chosen_item = min(ready_same_date_retries, key=retry_priority); self.retry_items.remove(chosen_item); return chosen_item, None
+        if cur_date_on_page in self.fresh_items_by_date: return self._pop_fresh(cur_date_on_page), None
+        if same_date_retries: return None, max(min(item['ready_at'] for item in same_date_retries) - now, 0)
+        unclaimed_date = next((date_str for date_str in self.fresh_items_by_date if date_str not in other_tab_dates), None)
+        if unclaimed_date is not None: return self._pop_fresh(unclaimed_date), None
+        if self.fresh_items_by_date: return self._pop_fresh(next(iter(self.fresh_items_by_date))), None
+        # Retries for a date another tab is on are left for that tab, which is already navigated there.
+        candidate_retries = [item for item in self.retry_items if item['key'][0] not in other_tab_dates]
+        if not candidate_retries:
+            if not self.retry_items: return None, None
+            # Only other tabs' retries are left; check back when the next one comes off backoff (or next round if all are ready).
+            pending_ready_times = [item['ready_at'] for item in self.retry_items if item['ready_at'] > now]
+            return None, (min(pending_ready_times) - now) if pending_ready_times else TAB_POLL_INTERVAL_SECONDS
+        ready_retries = [item for item in candidate_retries if item['ready_at'] <= now]
+        if not ready_retries: return None, max(min(item['ready_at'] for item in candidate_retries) - now, 0)
+        chosen_item = min(ready_retries, key=lambda item: (item['ready_at'], item['sequence'])); self.retry_items.remove(chosen_item); return chosen_item, None
+
 # --- scrape_and_enrich_csv  ---
-def scrape_and_enrich_csv(tasks_df_input, context_filter, current_phase_name="Phase Default", fuzzy_venue_matching=False):
-    logger.info(f"[{current_phase_name}] Starting scraping process for {len(tasks_df_input)} tasks... (Fuzzy Venue Matching: {fuzzy_venue_matching})")
+def scrape_and_enrich_csv(tasks_df_input, context_filter, current_phase_name="Phase Default", fuzzy_venue_matching=False, progress_tracker=None, num_tabs=TABS_PER_BROWSER, driver=None):
+    # A driver passed in (e.g. shared across backfill chunks) is reused as-is and left open; otherwise one is set up and quit here.
+    logger.info(f"[{current_phase_name}] Starting scraping process for {len(tasks_df_input)} tasks... (Fuzzy Venue Matching: {fuzzy_venue_matching}, Tabs: {num_tabs})")
     if tasks_df_input.empty: logger.warning(f"[{current_phase_name}] Input DataFrame is empty."); return pd.DataFrame(), pd.DataFrame(), set()
-    driver = None
-    try: driver = setup_driver()
+    owns_driver = driver is None
+    try:
+        if owns_driver:
+            with profiler.phase(f"{current_phase_name} - Driver Setup"): driver = setup_driver(num_tabs)
     except Exception as e_driver_setup:
         logger.critical(f"[{current_phase_name}] WebDriver setup failed: {e_driver_setup}. Phase cannot proceed.")
         error_marked_tasks_df = tasks_df_input.copy()
@@ -428,137 +1092,245 @@ def scrape_and_enrich_csv(tasks_df_input, context_filter, current_phase_name="Ph
     enriched_rows_collector_list = []; tasks_for_next_phase_collector_list = []; bad_dates_set_this_phase = set()
     failed_venue_date_pairs = set()
     tasks_df_processed_in_phase = tasks_df_input.copy()
+    # Result rows keep their task's index label, which is how unfinished tasks are found at the end; it must be unique.
+    if not tasks_df_processed_in_phase.index.is_unique: tasks_df_processed_in_phase.reset_index(drop=True, inplace=True)
     try:
         logger.debug(f"[{current_phase_name}] Preprocessing 'time' for 'date_only' grouping.")
-        def get_date_only_str_internal(time_val):
-            if pd.isna(time_val) or str(time_val).strip() == '': return None
-            for fmt in ('%d/%m/%Y %H:%M', '%m/%d/%Y %H:%M', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
-                try: return pd.to_datetime(time_val, format=fmt).strftime('%d/%m/%Y')
-                except (ValueError, TypeError): continue
-            dt_obj = pd.to_datetime(time_val, errors='coerce'); return dt_obj.strftime('%d/%m/%Y') if pd.notna(dt_obj) else None
-        tasks_df_processed_in_phase['date_only'] = tasks_df_processed_in_phase['time'].apply(get_date_only_str_internal)
+        with profiler.phase(f"{current_phase_name} - Date Grouping Parse"):
+            tasks_df_processed_in_phase['date_only'] = tasks_df_processed_in_phase['time'].apply(_get_date_only_str)
         original_len_before_date_parse_drop = len(tasks_df_processed_in_phase)
         tasks_df_processed_in_phase.dropna(subset=['date_only'], inplace=True)
         dropped_count = original_len_before_date_parse_drop - len(tasks_df_processed_in_phase)
         if dropped_count > 0: logger.warning(f"[{current_phase_name}] Dropped {dropped_count} tasks due to unparseable 'time' for 'date_only'.")
         if tasks_df_processed_in_phase.empty:
             logger.warning(f"[{current_phase_name}] No tasks after 'date_only' parsing. Phase ends.");
-            if driver: driver.quit(); return pd.DataFrame(), pd.DataFrame(), set()
+            if driver and owns_driver: driver.quit()
+            return pd.DataFrame(), pd.DataFrame(), set()
     except Exception as e_date_parse:
         logger.critical(f"[{current_phase_name}] Error during 'date_only' preprocessing: {e_date_parse}. Aborting phase.", exc_info=True)
         error_marked_tasks_df = tasks_df_input.copy(); error_marked_tasks_df['BSP Price Win'] = 'Date Parse Error For Grouping'; error_marked_tasks_df['BSP Price Place'] = 'Date Parse Error For Grouping'
-        if driver: driver.quit(); return error_marked_tasks_df, pd.DataFrame(), set()
+        if driver and owns_driver: driver.quit()
+        return error_marked_tasks_df, pd.DataFrame(), set()
 
     grouped_tasks_iter = tasks_df_processed_in_phase.groupby(['date_only', 'code', 'venue'], sort=False)
     logger.info(f"[{current_phase_name}] Tasks grouped into {len(grouped_tasks_iter)} [Date, Code, Venue] groups.")
+    work_queue = _ScrapeWorkQueue(grouped_tasks_iter)
+    # Progress is counted from the result rows themselves: every task gets exactly one row once it reaches its final
+    # status, whichever attempt that happens on, and a date is complete when all of its tasks have one.
+    progress_remaining_by_date = tasks_df_processed_in_phase.groupby('date_only').size().to_dict()
+    progress_done_by_date, progress_started_at_by_date = {}, {}
+    progress_rows_counted = 0
+    payload_collector = _NetworkPayloadCollector(driver.window_handles[:num_tabs]) if CAPTURE_NETWORK_PAYLOADS else None
+
+    def answer_from_payloads(tab, group_key, tasks_df):
+        """Answers every task whose race is in the captured payloads (draining the tab's new ones first). Returns the tasks still needing the DOM."""
+        if payload_collector is None or tasks_df.empty: return tasks_df
+        payload_collector.drain(driver, tab)
+        (date_str, code, venue) = group_key
+        needs_dom_mask = []
+        for _, task_series in tasks_df.iterrows():
+            prices_by_runner_no = payload_collector.lookup(date_str, code, venue, task_series['raceno'])
+            runner_no_str = str(task_series['runnerno']).strip()
+            if prices_by_runner_no is None or runner_no_str not in prices_by_runner_no: needs_dom_mask.append(True); continue
+            win_price_text, place_price_text = prices_by_runner_no[runner_no_str]
+            task_copy = task_series.copy(); task_copy['BSP Price Win'], task_copy['BSP Price Place'] = win_price_text or "N/A", place_price_text or "N/A"
+            enriched_rows_collector_list.append(task_copy); needs_dom_mask.append(False)
+        answered_count = needs_dom_mask.count(False)
+        if answered_count: logger.info(f"[{tab.log_label}] '{venue}' ({date_str}): {answered_count}/{len(tasks_df)} task(s) answered from captured payloads.")
+        return tasks_df[needs_dom_mask]
+
+    def report_progress(flush_partial=False):
+        """Counts result rows added since the last call and reports each date whose tasks are all final (or, on flush, any date with progress)."""
+        nonlocal progress_rows_counted
+        if progress_tracker is None: return
+        for task_series in enriched_rows_collector_list[progress_rows_counted:]:
+            date_str = task_series.get('date_only')
+            if progress_remaining_by_date.get(date_str, 0) <= 0: continue
+            progress_remaining_by_date[date_str] -= 1; progress_done_by_date[date_str] = progress_done_by_date.get(date_str, 0) + 1
+        progress_rows_counted = len(enriched_rows_collector_list)
+        for date_str, done_count in list(progress_done_by_date.items()):
+            if progress_remaining_by_date[date_str] > 0 and not flush_partial: continue
+            progress_tracker.date_completed(date_str, done_count, time.monotonic() - progress_started_at_by_date.get(date_str, time.monotonic()))
+            del progress_done_by_date[date_str]
+
+    def requeue_or_finalize(work_item, tasks_df, error_label, failure_reason):
+        """Re-queues a failed group (or race subset) with backoff, or gives it its final error status once attempts are exhausted."""
+        (item_date_str, _, item_venue) = work_item['key']
+        if work_item['attempt'] < RETRY_MAX_ATTEMPTS:
+            backoff_seconds = work_queue.push_retry(work_item['key'], tasks_df, work_item['attempt'] + 1, error_label)
+            logger.warning(f"[{current_phase_name}] RE-QUEUED '{item_venue}' ({item_date_str}, {len(tasks_df)} tasks) after '{error_label}' on attempt {work_item['attempt']}/{RETRY_MAX_ATTEMPTS}. Retrying in {backoff_seconds}s with fuzzy venue matching.")
+            return False
+        logger.error(f"[{current_phase_name}] GIVING UP on '{item_venue}' ({item_date_str}, {len(tasks_df)} tasks) after {work_item['attempt']} attempt(s). Final status: '{error_label}'.")
+        failed_venue_date_pairs.add((item_date_str, failure_reason))
+        for _, task_series in tasks_df.iterrows():
+            task_copy = task_series.copy(); task_copy['BSP Price Win'], task_copy['BSP Price Place'] = error_label, error_label; enriched_rows_collector_list.append(task_copy)
+            tasks_for_next_phase_collector_list.append(task_series.copy())
+        return True
 
-    try:
-        logger.info(f"[{current_phase_name}] Navigating to base URL: {base_url}"); driver.get(base_url)
-        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "pb-6"))); logger.info(f"[{current_phase_name}] Page loaded: {base_url}")
-        cur_date_on_page, cur_code_on_page, cur_venue_on_page = None, None, None; active_meeting_el_on_page = None; venue_failures_on_current_date_count = 0
-
-        for (date_str_group, csv_code_group, csv_venue_group), venue_group_tasks_df in grouped_tasks_iter:
-            context_filter.current_date = date_str_group
-            logger.debug(f"[{current_phase_name}] Group: Code='{csv_code_group.upper()}', Venue='{csv_venue_group}' ({len(venue_group_tasks_df)} tasks)")
+    def fail_date(tab, work_item, tasks_df, error_label):
+        """
+        Re-queues (or finalises) a group whose date failed to select/load, together with every other queued group for that
+        date, so the date is navigated to once per attempt rather than once per group. Groups are left alone while another
+        tab has the date loaded.
+        """
+        date_str = work_item['key'][0]
+        requeue_or_finalize(work_item, tasks_df, error_label, f"ALL VENUES - {error_label}")
+        if any(other_tab.cur_date_on_page == date_str for other_tab in tabs if other_tab is not tab): return
+        date_items = work_queue.take_date_items(date_str)
+        if date_items: logger.warning(f"[{tab.log_label}] Date {date_str} failed on attempt {work_item['attempt']}. Moving its {len(date_items)} other queued group(s) along with it.")
+        for date_item in date_items:
+            requeue_or_finalize({**date_item, 'attempt': max(date_item['attempt'], work_item['attempt'])}, date_item['tasks_df'], error_label, f"ALL VENUES - {error_label}")
+
+    def scrape_tab(tab):
+        """Generator worker for one tab: pulls work from the shared queue and yields at every page wait."""
+        if driver.current_url != base_url: logger.info(f"[{tab.log_label}] Navigating to base URL: {base_url}"); driver.get(base_url)
+        yield from _poll_until(driver, EC.presence_of_element_located((By.CLASS_NAME, "pb-6")), wait._timeout, "Base page did not load."); logger.info(f"[{tab.log_label}] Page loaded: {base_url}")
+
+        while True:
+            report_progress()
+            work_item, wait_seconds = work_queue.next_item(tab.cur_date_on_page, tab.cur_code_on_page, {other_tab.target_date for other_tab in tabs if other_tab is not tab})
+            if work_item is None:
+                if wait_seconds is None: break
+                logger.debug(f"[{tab.log_label}] Waiting {wait_seconds:.1f}s for the next retry to come off backoff."); yield from _idle(wait_seconds, page_settle=False); continue
+            (date_str_group, csv_code_group, csv_venue_group), venue_group_tasks_df, attempt_number = work_item['key'], work_item['tasks_df'], work_item['attempt']
+            use_fuzzy_venue_matching = fuzzy_venue_matching or attempt_number > 1
+            tab.target_date = tab.log_date = context_filter.current_date = date_str_group
+            progress_started_at_by_date.setdefault(date_str_group, time.monotonic())
+            venue_group_tasks_df = answer_from_payloads(tab, work_item['key'], venue_group_tasks_df)
+            if venue_group_tasks_df.empty: continue
+            logger.debug(f"[{tab.log_label}] Group: Code='{csv_code_group.upper()}', Venue='{csv_venue_group}' ({len(venue_group_tasks_df)} tasks, attempt {attempt_number}/{RETRY_MAX_ATTEMPTS})")
             if date_str_group in bad_dates_set_this_phase:
-                logger.warning(f"[{current_phase_name}] Date {date_str_group} previously failed. Skipping group.")
-                for _, task_series in venue_group_tasks_df.iterrows(): task_copy = task_series.copy(); task_copy['BSP Price Win'], task_copy['BSP Price Place'] = 'Date Previously Failed This Phase', 'Date Previously Failed This Phase'; enriched_rows_collector_list.append(task_copy)
-                continue
-
-            if cur_date_on_page != date_str_group:
-                logger.info(f"[{current_phase_name}] Processing date: {date_str_group}")
-                venue_failures_on_current_date_count = 0
-                if not select_date_on_calendar(driver, date_load_wait, date_str_group):
-                    logger.error(f"[{current_phase_name}] DATE FAILURE for '{date_str_group}'."); bad_dates_set_this_phase.add(date_str_group)
-                    failed_venue_date_pairs.add((date_str_group, f"ALL VENUES - Date selection failed"))
-                    for _, task_series in venue_group_tasks_df.iterrows(): task_copy = task_series.copy(); task_copy['BSP Price Win'],task_copy['BSP Price Place'] = 'Date Selection Error','Date Selection Error'; enriched_rows_collector_list.append(task_copy)
-                    cur_date_on_page = "Error_Date_Selection"; cur_code_on_page = None; cur_venue_on_page = None; active_meeting_el_on_page = None; continue
-
-                handle_popups(driver)
-                logger.debug(f"[{current_phase_name}] DATE '{date_str_group}' selected. Verifying data panel (up to {date_load_wait._timeout}s)...")
+                if attempt_number == 1:
+                    logger.warning(f"[{tab.log_label}] Date {date_str_group} previously failed. Skipping group.")
+                    for _, task_series in venue_group_tasks_df.iterrows(): task_copy = task_series.copy(); task_copy['BSP Price Win'], task_copy['BSP Price Place'] = 'Date Previously Failed This Phase', 'Date Previously Failed This Phase'; enriched_rows_collector_list.append(task_copy)
+                    continue
+                # Retries are explicit, bounded second chances: give the date another go.
+                bad_dates_set_this_phase.discard(date_str_group)
+
+            if tab.cur_date_on_page != date_str_group:
+                logger.info(f"[{tab.log_label}] Processing date: {date_str_group}")
+                tab.venue_failures_on_current_date_count = 0
+                if not (yield from select_date_on_calendar(driver, date_load_wait, date_str_group, wait_for_spinner=False)):
+                    logger.error(f"[{tab.log_label}] DATE FAILURE for '{date_str_group}'.")
+                    fail_date(tab, work_item, venue_group_tasks_df, 'Date Selection Error')
+                    tab.cur_date_on_page = "Error_Date_Selection"; tab.cur_code_on_page = None; tab.cur_venue_on_page = None; tab.active_meeting_el_on_page = None; continue
+
+                if not (yield from _poll_loading_spinner(driver, 15, 15)): logger.warning(f"[{tab.log_label}] Calendar: Spinner NOT detected or timed out after 15s for day selection. Proceeding, main data load wait will follow.")
+                yield from handle_popups(driver)
+                logger.debug(f"[{tab.log_label}] DATE '{date_str_group}' selected. Verifying data panel (up to {date_load_wait._timeout}s)...")
                 try:
-                    wait.until(EC.presence_of_element_located((By.CLASS_NAME, "filter-panel"))); date_load_wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.filters-list div.filter:not([style*='display: none'])")))
-                    logger.debug(f"[{current_phase_name}] FILTER LIST POPULATED for '{date_str_group}'. OK.")
-                    cur_date_on_page = date_str_group; cur_code_on_page = None; cur_venue_on_page = None; active_meeting_el_on_page = None;
+                    yield from _poll_until(driver, EC.presence_of_element_located((By.CLASS_NAME, "filter-panel")), wait._timeout, "Filter panel not present.")
+                    yield from _poll_until(driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.filters-list div.filter:not([style*='display: none'])")), date_load_wait._timeout, f"Filter list not populated within {date_load_wait._timeout}s.")
+                    logger.debug(f"[{tab.log_label}] FILTER LIST POPULATED for '{date_str_group}'. OK.")
+                    tab.cur_date_on_page = date_str_group; tab.cur_code_on_page = None; tab.cur_venue_on_page = None; tab.active_meeting_el_on_page = None;
+                    venue_group_tasks_df = answer_from_payloads(tab, work_item['key'], venue_group_tasks_df)
+                    if venue_group_tasks_df.empty: continue
                 except TimeoutException as e_data_load_timeout:
-                    error_label_for_date_load = 'Date Data Not Loaded'; logger.error(f"[{current_phase_name}] {error_label_for_date_load.upper()} for '{date_str_group}': {e_data_load_timeout.msg}. Collecting for retry.")
-                    bad_dates_set_this_phase.add(date_str_group)
-                    failed_venue_date_pairs.add((date_str_group, f"ALL VENUES - Date data load failed"))
-                    for _, task_series in venue_group_tasks_df.iterrows():
-                        task_copy_for_error = task_series.copy(); task_copy_for_error['BSP Price Win'], task_copy_for_error['BSP Price Place'] = error_label_for_date_load, error_label_for_date_load; enriched_rows_collector_list.append(task_copy_for_error)
-                        tasks_for_next_phase_collector_list.append(task_series.copy())
-                    cur_date_on_page = "Error_Date_Load"; cur_code_on_page = None; cur_venue_on_page = None; active_meeting_el_on_page = None; continue
+                    error_label_for_date_load = 'Date Data Not Loaded'; logger.error(f"[{tab.log_label}] {error_label_for_date_load.upper()} for '{date_str_group}': {e_data_load_timeout.msg}.")
+                    fail_date(tab, work_item, venue_group_tasks_df, error_label_for_date_load)
+                    tab.cur_date_on_page = "Error_Date_Load"; tab.cur_code_on_page = None; tab.cur_venue_on_page = None; tab.active_meeting_el_on_page = None; continue
 
             target_web_code_id_str = CODE_TO_ID_MAP.get(csv_code_group.lower())
             if not target_web_code_id_str:
-                logger.error(f"[{current_phase_name}] CODE UNKNOWN: '{csv_code_group}'. Skipping.");
+                logger.error(f"[{tab.log_label}] CODE UNKNOWN: '{csv_code_group}'. Skipping.");
                 for _, task_series in venue_group_tasks_df.iterrows(): task_copy = task_series.copy(); task_copy['BSP Price Win'],task_copy['BSP Price Place']='Unknown Race Code','Unknown Race Code'; enriched_rows_collector_list.append(task_copy)
                 continue
 
-            if cur_code_on_page != target_web_code_id_str:
-                logger.debug(f"[{current_phase_name}] CODE CHANGE: Page='{cur_code_on_page or 'None'}', Target='{target_web_code_id_str}'.")
+            if tab.cur_code_on_page != target_web_code_id_str:
+                logger.debug(f"[{tab.log_label}] CODE CHANGE: Page='{tab.cur_code_on_page or 'None'}', Target='{target_web_code_id_str}'.")
                 try:
-                    code_button_el = wait.until(EC.element_to_be_clickable((By.ID, target_web_code_id_str)))
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", code_button_el); time.sleep(0.3)
-                    driver.execute_script("arguments[0].click();", code_button_el); logger.debug(f"[{current_phase_name}] Code button '{target_web_code_id_str}' clicked.")
-                    try: spinner_locator = (By.CSS_SELECTOR, "img.loading[style*='display: block'], img.loading:not([style*='display: none'])"); wait_short.until(EC.visibility_of_element_located(spinner_locator)); wait.until(EC.invisibility_of_element_located(spinner_locator))
-                    except TimeoutException: logger.debug(f"[{current_phase_name}] Spinner not detected/timed out for code change.")
-                    wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.filters-list div.filter:not([style*='display: none'])"))); logger.debug(f"[{current_phase_name}] CODE SWITCHED to '{target_web_code_id_str}'.")
-                    cur_code_on_page = target_web_code_id_str; cur_venue_on_page = None; active_meeting_el_on_page = None;
+                    code_button_el = yield from _poll_until(driver, EC.element_to_be_clickable((By.ID, target_web_code_id_str)), wait._timeout, f"Code button '{target_web_code_id_str}' not clickable.")
+                    driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", code_button_el); yield from _idle(0.3)
+                    driver.execute_script("arguments[0].click();", code_button_el); logger.debug(f"[{tab.log_label}] Code button '{target_web_code_id_str}' clicked.")
+                    if not (yield from _poll_loading_spinner(driver, wait_short._timeout, wait._timeout)): logger.debug(f"[{tab.log_label}] Spinner not detected/timed out for code change.")
+                    yield from _poll_until(driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.filters-list div.filter:not([style*='display: none'])")), wait._timeout, "Filter list not populated after code change."); logger.debug(f"[{tab.log_label}] CODE SWITCHED to '{target_web_code_id_str}'.")
+                    tab.cur_code_on_page = target_web_code_id_str; tab.cur_venue_on_page = None; tab.active_meeting_el_on_page = None;
+                    venue_group_tasks_df = answer_from_payloads(tab, work_item['key'], venue_group_tasks_df)
+                    if venue_group_tasks_df.empty: continue
                 except Exception as e_code_change:
-                    logger.error(f"[{current_phase_name}] CODE CHANGE ERROR for '{target_web_code_id_str}': {e_code_change}. Skipping.", exc_info=True);
-                    for _, task_series in venue_group_tasks_df.iterrows(): task_copy = task_series.copy(); task_copy['BSP Price Win'],task_copy['BSP Price Place']='Code Selection Error','Code Selection Error'; enriched_rows_collector_list.append(task_copy)
-                    cur_code_on_page = "Error_Code_Change"; continue
+                    logger.error(f"[{tab.log_label}] CODE CHANGE ERROR for '{target_web_code_id_str}': {e_code_change}.", exc_info=True);
+                    requeue_or_finalize(work_item, venue_group_tasks_df, 'Code Selection Error', f"{csv_venue_group} - Code selection failed")
+                    tab.cur_code_on_page = "Error_Code_Change"; continue
 
-            if cur_venue_on_page != csv_venue_group or active_meeting_el_on_page is None:
-                logger.debug(f"[{current_phase_name}] VENUE CHANGE/VALIDATION: Page='{cur_venue_on_page or 'None'}', Target='{csv_venue_group}'.")
+            if tab.cur_venue_on_page != csv_venue_group or tab.active_meeting_el_on_page is None:
+                logger.debug(f"[{tab.log_label}] VENUE CHANGE/VALIDATION: Page='{tab.cur_venue_on_page or 'None'}', Target='{csv_venue_group}'.")
                 try:
-                    venue_found_and_clicked = _find_and_click_venue(driver, wait, csv_venue_group, current_phase_name, fuzzy_venue_matching)
+                    venue_found_and_clicked = yield from _find_and_click_venue(driver, wait, csv_venue_group, tab.log_label, use_fuzzy_venue_matching)
                     if not venue_found_and_clicked:
                         raise TimeoutException(f"Venue '{csv_venue_group}' could not be found or clicked.")
 
-                    try: spinner_locator = (By.CSS_SELECTOR, "img.loading[style*='display: block'], img.loading:not([style*='display: none'])"); wait_short.until(EC.visibility_of_element_located(spinner_locator)); wait.until(EC.invisibility_of_element_located(spinner_locator))
-                    except TimeoutException: logger.debug(f"[{current_phase_name}] Spinner not detected/timed out for venue '{csv_venue_group}'.")
+                    if not (yield from _poll_loading_spinner(driver, wait_short._timeout, wait._timeout)): logger.debug(f"[{tab.log_label}] Spinner not detected/timed out for venue '{csv_venue_group}'.")
 
                     active_meeting_xpath_str = "//div[@class='meetings-list']/div[@class='meeting' and not(contains(@style, 'display: none'))]"
-                    active_meeting_el_on_page = wait.until(EC.visibility_of_element_located((By.XPATH, active_meeting_xpath_str))); wait.until(EC.presence_of_all_elements_located((By.XPATH, f"{active_meeting_xpath_str}//div[contains(@class, 'race-tab')]")))
-                    logger.debug(f"[{current_phase_name}] VENUE SELECTED: '{csv_venue_group}'."); cur_venue_on_page = csv_venue_group; venue_failures_on_current_date_count = 0
+                    tab.active_meeting_el_on_page = yield from _poll_until(driver, EC.visibility_of_element_located((By.XPATH, active_meeting_xpath_str)), wait._timeout, "Active meeting not visible.")
+                    yield from _poll_until(driver, EC.presence_of_all_elements_located((By.XPATH, f"{active_meeting_xpath_str}//div[contains(@class, 'race-tab')]")), wait._timeout, "Race tabs not present.")
+                    logger.debug(f"[{tab.log_label}] VENUE SELECTED: '{csv_venue_group}'."); tab.cur_venue_on_page = csv_venue_group; tab.venue_failures_on_current_date_count = 0
+                    venue_group_tasks_df = answer_from_payloads(tab, work_item['key'], venue_group_tasks_df)
+                    if venue_group_tasks_df.empty: continue
 
                 except Exception as e_venue_select:
                     error_msg_type = "Ambiguous Fuzzy Match" if "AMBIGUOUS" in str(e_venue_select) else "Venue Load Error"
-                    logger.error(f"[{current_phase_name}] VENUE ERROR for '{csv_venue_group}': {error_msg_type}. Marking tasks.", exc_info=False)
-                    failed_venue_date_pairs.add((date_str_group, csv_venue_group))
-                    venue_failures_on_current_date_count += 1
-                    for _, task_series in venue_group_tasks_df.iterrows():
-                        task_copy = task_series.copy()
-                        task_copy['BSP Price Win'],task_copy['BSP Price Place'] = error_msg_type, error_msg_type
-                        enriched_rows_collector_list.append(task_copy)
-                        if error_msg_type == "Venue Load Error":
-                           tasks_for_next_phase_collector_list.append(task_series.copy())
-
-                    if venue_failures_on_current_date_count >= MAX_VENUE_FAILURES_PER_DATE: logger.warning(f"[{current_phase_name}] MAX VENUE FAILURES ({venue_failures_on_current_date_count}) for date '{date_str_group}'. Marking date bad."); bad_dates_set_this_phase.add(date_str_group)
-                    cur_venue_on_page, active_meeting_el_on_page = "Error_Venue_Load", None; continue
-
-            if not active_meeting_el_on_page:
-                logger.error(f"[{current_phase_name}] Race processing skipped for '{csv_venue_group}': Active meeting element unavailable."); error_label = 'Venue Data Unavailable'
+                    logger.error(f"[{tab.log_label}] VENUE ERROR for '{csv_venue_group}': {error_msg_type}.", exc_info=False)
+                    # Only final failures count towards giving up on the date; re-queued ones still have attempts left.
+                    if error_msg_type == "Venue Load Error":
+                        if requeue_or_finalize(work_item, venue_group_tasks_df, error_msg_type, csv_venue_group): tab.venue_failures_on_current_date_count += 1
+                    else:
+                        tab.venue_failures_on_current_date_count += 1
+                        failed_venue_date_pairs.add((date_str_group, csv_venue_group))
+                        for _, task_series in venue_group_tasks_df.iterrows(): task_copy = task_series.copy(); task_copy['BSP Price Win'],task_copy['BSP Price Place'] = error_msg_type, error_msg_type; enriched_rows_collector_list.append(task_copy)
+
+                    if tab.venue_failures_on_current_date_count >= MAX_VENUE_FAILURES_PER_DATE: logger.warning(f"[{tab.log_label}] MAX VENUE FAILURES ({tab.venue_failures_on_current_date_count}) for date '{date_str_group}'. Marking date bad."); bad_dates_set_this_phase.add(date_str_group)
+                    tab.cur_venue_on_page, tab.active_meeting_el_on_page = "Error_Venue_Load", None; continue
+
+            if not tab.active_meeting_el_on_page:
+                logger.error(f"[{tab.log_label}] Race processing skipped for '{csv_venue_group}': Active meeting element unavailable."); error_label = 'Venue Data Unavailable'
                 for _, task_series in venue_group_tasks_df.iterrows():
                     already_marked = any(all(er.get(k) == task_series.get(k) for k in ['time', 'venue', 'raceno', 'runnerno'] if k in task_series and k in er) and er.get('BSP Price Win') == 'Venue Load Error' for er in enriched_rows_collector_list if isinstance(er, pd.Series))
                     if not already_marked: task_copy = task_series.copy(); task_copy['BSP Price Win'],task_copy['BSP Price Place']=error_label,error_label; enriched_rows_collector_list.append(task_copy)
                 continue
 
             races_in_group_iter = venue_group_tasks_df.groupby('raceno', sort=False)
-            logger.debug(f"[{current_phase_name}] Venue '{csv_venue_group}': Processing {len(races_in_group_iter)} race number(s).")
+            logger.debug(f"[{tab.log_label}] Venue '{csv_venue_group}': Processing {len(races_in_group_iter)} race number(s).")
             for raceno_val, race_tasks_for_raceno_df in races_in_group_iter:
-                processed_race_task_series_list = _fetch_bsp_for_race_runners(driver, wait, active_meeting_el_on_page, raceno_val, race_tasks_for_raceno_df, csv_venue_group)
+                processed_race_task_series_list = yield from _fetch_bsp_for_race_runners(driver, wait, tab.active_meeting_el_on_page, raceno_val, race_tasks_for_raceno_df, csv_venue_group, date_str_group, csv_code_group)
+                race_level_error = processed_race_task_series_list[0].get('BSP Price Win') if processed_race_task_series_list else None
+                if race_level_error in RETRYABLE_RACE_ERRORS:
+                    requeue_or_finalize(work_item, race_tasks_for_raceno_df, race_level_error, f"{csv_venue_group} - R{raceno_val} {race_level_error}")
+                    if race_level_error == 'Venue Element Error Mid-Race': tab.active_meeting_el_on_page = None
+                    continue
                 enriched_rows_collector_list.extend(processed_race_task_series_list)
+        report_progress()
+
+    tabs = []
+    profiler.start_phase(f"{current_phase_name} - Scrape Loop")
+    try:
+        tabs.extend(_TabState(tab_index, window_handle, current_phase_name if num_tabs == 1 else f"{current_phase_name} Tab {tab_index + 1}") for tab_index, window_handle in enumerate(driver.window_handles[:num_tabs]))
+        _run_tab_scheduler(driver, [(tab, scrape_tab(tab)) for tab in tabs], context_filter)
     except WebDriverException as e_webdriver_main_loop:
         logger.critical(f"[{current_phase_name}] CRITICAL WebDriverException in main loop: {e_webdriver_main_loop.msg if hasattr(e_webdriver_main_loop, 'msg') else e_webdriver_main_loop}. Aborting phase.", exc_info=True)
     except Exception as e_main_loop_other: logger.critical(f"[{current_phase_name}] CRITICAL UNHANDLED ERROR in main loop: {e_main_loop_other}", exc_info=True)
     finally:
-        if driver: logger.info(f"[{current_phase_name}] Closing WebDriver session."); driver.quit(); logger.debug(f"[{current_phase_name}] WebDriver session closed.")
+        profiler.end_phase()
+        if payload_collector is not None: logger.info(f"[{current_phase_name}] Payload capture: {payload_collector.payload_count} JSON payload(s) with BSP data, {len(payload_collector.bsp_tables)} race table(s) cached.")
+        for pending_retry in work_queue.drain_retries():
+            logger.warning(f"[{current_phase_name}] Session ended with '{pending_retry['key'][2]}' ({pending_retry['key'][0]}) still queued for retry. Final status: '{pending_retry['reason']}'.")
+            failed_venue_date_pairs.add((pending_retry['key'][0], pending_retry['key'][2]))
+            for _, task_series in pending_retry['tasks_df'].iterrows():
+                task_copy = task_series.copy(); task_copy['BSP Price Win'], task_copy['BSP Price Place'] = pending_retry['reason'], pending_retry['reason']; enriched_rows_collector_list.append(task_copy)
+                tasks_for_next_phase_collector_list.append(task_series.copy())
+        # Tasks still queued or half-done when the main loop ended (e.g. it aborted) get a row too, so none go missing.
+        finished_task_labels = {task_series.name for task_series in enriched_rows_collector_list}
+        unfinished_tasks_df = tasks_df_processed_in_phase[~tasks_df_processed_in_phase.index.isin(finished_task_labels)]
+        if not unfinished_tasks_df.empty:
+            logger.warning(f"[{current_phase_name}] Session ended with {len(unfinished_tasks_df)} task(s) unfinished. Final status: 'Processing Incomplete'.")
+            for _, task_series in unfinished_tasks_df.iterrows():
+                task_copy = task_series.copy(); task_copy['BSP Price Win'], task_copy['BSP Price Place'] = 'Processing Incomplete', 'Processing Incomplete'; enriched_rows_collector_list.append(task_copy)
+                tasks_for_next_phase_collector_list.append(task_series.copy())
+        if driver and owns_driver: logger.info(f"[{current_phase_name}] Closing WebDriver session."); driver.quit(); logger.debug(f"[{current_phase_name}] WebDriver session closed.")
+        report_progress(flush_partial=True)
         enriched_df_this_phase = pd.DataFrame()
         if enriched_rows_collector_list:
-            enriched_df_this_phase = pd.DataFrame(enriched_rows_collector_list)
+            with profiler.phase(f"{current_phase_name} - Build Results DataFrame"): enriched_df_this_phase = pd.DataFrame(enriched_rows_collector_list)
             expected_cols_schema = tasks_df_input.columns.tolist() + ['BSP Price Win', 'BSP Price Place']
             if 'date_only' in expected_cols_schema: expected_cols_schema.remove('date_only')
             for col_name in expected_cols_schema:
@@ -573,16 +1345,120 @@ def scrape_and_enrich_csv(tasks_df_input, context_filter, current_phase_name="Ph
             if id_cols_from_original_input and not retry_df_for_next_phase.empty: retry_df_for_next_phase.drop_duplicates(subset=id_cols_from_original_input, keep='first', inplace=True)
             if 'date_only' in retry_df_for_next_phase.columns: retry_df_for_next_phase = retry_df_for_next_phase.drop(columns=['date_only'], errors='ignore')
 
-        logger.info(f"[{current_phase_name}] Identified {len(retry_df_for_next_phase)} unique tasks for potential retry.")
-        logger.info(f"[{current_phase_name}] Scraping finished. Returning {len(enriched_df_this_phase)} processed rows and {len(retry_df_for_next_phase)} tasks for retry.")
+        logger.info(f"[{current_phase_name}] {len(retry_df_for_next_phase)} unique tasks exhausted their {RETRY_MAX_ATTEMPTS} attempts.")
+        logger.info(f"[{current_phase_name}] Scraping finished. Returning {len(enriched_df_this_phase)} processed rows and {len(retry_df_for_next_phase)} unresolved tasks.")
         return enriched_df_this_phase, retry_df_for_next_phase, failed_venue_date_pairs
 
+# --- run_scraping_session  ---
+def run_scraping_session(tasks_df_input, context_filter, phase_label_prefix="", progress_tracker=None, driver=None):
+    """Runs one scraping session (retries are handled in-process by the work queue). Returns (list of result DataFrames, failed venue-date pairs)."""
+    logger.info(f"--- Starting {phase_label_prefix}Scraping (Exact Venue Match, in-process retries with Fuzzy Venue Match) ---")
+    enriched_results_df, unresolved_tasks_df, failed_venue_date_pairs = scrape_and_enrich_csv(
+        tasks_df_input.copy(),
+        context_filter,
+        current_phase_name=f"{phase_label_prefix}Scrape",
+        progress_tracker=progress_tracker,
+        driver=driver
+    )
+    logger.info(f"--- {phase_label_prefix}Scraping Finished. Processed {len(enriched_results_df)} task results. {len(unresolved_tasks_df)} tasks unresolved after retries. ---")
+    return [enriched_results_df], set(failed_venue_date_pairs)
+
+# --- run_backfill  ---
+def run_backfill(tasks_df_input, context_filter, max_tasks_per_chunk=BACKFILL_MAX_TASKS_PER_CHUNK, cooldown_seconds=BACKFILL_COOLDOWN_SECONDS):
+    """
+    Scrapes an arbitrary historical range in per-month chunks. Tasks are sorted chronologically so each
+    date's groups are contiguous, months larger than max_tasks_per_chunk are split on date boundaries,
+    and the chunks run oldest first through one shared browser, so after the first chunk the calendar only
+    moves between adjacent months. A new browser is started if the shared one dies.
+    """
+    df = tasks_df_input.copy()
+    df['temp_parsed_datetime'] = df['time'].apply(_robust_to_datetime)
+    df = df.dropna(subset=['temp_parsed_datetime']).sort_values('temp_parsed_datetime', kind='stable')
+    df['temp_backfill_month'] = df['temp_parsed_datetime'].dt.strftime('%Y-%m'); df['temp_backfill_date'] = df['temp_parsed_datetime'].dt.date
+
+    chunks = []
+    for month_str, month_df in df.groupby('temp_backfill_month', sort=True):
+        chunk_parts, chunk_task_count = [], 0
+        for _, date_df in month_df.groupby('temp_backfill_date', sort=True):
+            if chunk_parts and chunk_task_count + len(date_df) > max_tasks_per_chunk:
+                chunks.append((month_str, pd.concat(chunk_parts))); chunk_parts, chunk_task_count = [], 0
+            chunk_parts.append(date_df); chunk_task_count += len(date_df)
+        if chunk_parts: chunks.append((month_str, pd.concat(chunk_parts)))
+
+    logger.info(f"Backfill: {len(df)} tasks across {df['temp_backfill_date'].nunique()} dates split into {len(chunks)} chunk(s) (max {max_tasks_per_chunk} tasks, {cooldown_seconds}s cooldown).")
+    progress_tracker = BackfillProgressTracker(total_tasks=len(df), total_dates=df['temp_backfill_date'].nunique(), parallel_workers=TABS_PER_BROWSER)
+    all_phases_results_list, all_failed_venue_date_pairs = [], set()
+    temp_cols = ['temp_parsed_datetime', 'temp_backfill_month', 'temp_backfill_date']
+    shared_driver = None
+    try:
+        for chunk_index, (month_str, chunk_df) in enumerate(chunks, start=1):
+            logger.info(f"--- Backfill chunk {chunk_index}/{len(chunks)}: month {month_str}, {len(chunk_df)} tasks ---")
+            if shared_driver is not None and not _driver_is_alive(shared_driver):
+                logger.warning("Backfill: Shared WebDriver session is no longer responding. Starting a new one."); shared_driver = None
+            if shared_driver is None:
+                try:
+                    with profiler.phase(f"Backfill {month_str} - Driver Setup"): shared_driver = setup_driver(TABS_PER_BROWSER)
+                except Exception as e_driver_setup: logger.error(f"Backfill: WebDriver setup failed for chunk {chunk_index}: {e_driver_setup}.")
+            # With no shared driver, the session tries its own setup and marks the chunk's tasks if that fails too.
+            chunk_results_list, chunk_failures = run_scraping_session(chunk_df.drop(columns=temp_cols), context_filter, phase_label_prefix=f"Backfill {month_str} ", progress_tracker=progress_tracker, driver=shared_driver)
+            all_phases_results_list.extend(chunk_results_list); all_failed_venue_date_pairs.update(chunk_failures)
+            if chunk_index < len(chunks) and cooldown_seconds > 0:
+                context_filter.current_date = 'Backfill Cooldown'
+                logger.info(f"Backfill: Cooling down for {cooldown_seconds}s before the next chunk.")
+                profiler.idle_sleep(cooldown_seconds)
+    finally:
+        if shared_driver is not None:
+            logger.info("Backfill: Closing shared WebDriver session.")
+            try: shared_driver.quit()
+            except WebDriverException as e: logger.debug(f"Backfill: Error closing WebDriver: {e}")
+    return all_phases_results_list, all_failed_venue_date_pairs
+
+# --- Run summary logging  ---
+def log_scraping_summary(final_combined_output_df, total_tasks_attempted):
+    """Logs the overall success/failure counts for a run's results."""
+    logger.info(f"Total rows in final output: {len(final_combined_output_df)}")
+    if not final_combined_output_df.empty:
+        # Case-insensitive search for the BSP column to perform the success check
+        bsp_win_col_actual_name = None
+        for col in final_combined_output_df.columns:
+            if str(col).lower() == 'bsp price win':
+                bsp_win_col_actual_name = col
+                break
+
+        if bsp_win_col_actual_name:
+            with profiler.phase("Main - Summary Stats"):
+                error_check_series = final_combined_output_df[bsp_win_col_actual_name].fillna('na_placeholder_for_error_check').astype(str).str.lower()
+                failed_scrapes_mask_final = error_check_series.isin(SCRIPT_ERROR_VALUES)
+                failed_scrapes_count_final = failed_scrapes_mask_final.sum()
+            successful_scrapes_count_final = len(final_combined_output_df) - failed_scrapes_count_final
+        else:
+            logger.warning(f"Column 'BSP Price Win' (case-insensitive) missing from final combined data. Cannot calculate success/failure stats accurately.")
+            failed_scrapes_count_final = len(final_combined_output_df); successful_scrapes_count_final = 0
+
+        logger.info("--- OVERALL SCRAPING SUMMARY ---")
+        logger.info(f"  Total Tasks Attempted: {total_tasks_attempted}")
+        logger.info(f"  Successfully Scraped (valid BSP data or 'N/A'): {successful_scrapes_count_final}")
+        logger.info(f"  Failed Scrapes (Script Error, Not Found, etc.): {failed_scrapes_count_final}")
+        logger.info("--------------------------------")
+    else: logger.info("--- OVERALL SCRAPING SUMMARY --- Final combined DataFrame is empty. ---")
+
+def log_missed_venue_date_pairs(all_failed_venue_date_pairs):
+    if all_failed_venue_date_pairs:
+        logger.info("--- MISSED VENUE-DATE PAIRS ---")
+        sorted_failures = sorted(list(all_failed_venue_date_pairs))
+        for date, venue in sorted_failures:
+            logger.info(f"  - Date: {date}, Venue/Reason: {venue}")
+        logger.info("-------------------------------")
+
 # --- format_and_save_data  ---
-def format_and_save_data(final_df_to_save, original_input_df_for_headers_ref):
-    output_filename = "final_results.csv"
+def format_and_save_data(final_df_to_save, original_input_df_for_headers_ref, output_filename=OUTPUT_FILENAME, append=False):
+    # With append=True, rows are added to an existing output file (in that file's column order) instead of replacing it.
     logger.debug(f"Preparing to save data to '{output_filename}'.")
+    existing_output_header = None
+    if append and os.path.exists(output_filename):
+        with open(output_filename, mode='r', encoding='utf-8-sig', newline='') as existing_file: existing_output_header = next(csv.reader(existing_file), None)
 
-    if os.path.exists(output_filename):
+    if os.path.exists(output_filename) and not existing_output_header:
         try: os.remove(output_filename); logger.info(f"Removed existing output file: '{output_filename}'.")
         except OSError as e: logger.error(f"Could not remove existing '{output_filename}': {e}.")
 
@@ -597,6 +1473,8 @@ def format_and_save_data(final_df_to_save, original_input_df_for_headers_ref):
     final_header_order.extend(["BSP Price Win", "BSP Price Place"])
 
     # Handle case where there is no data to save
+    if (final_df_to_save is None or final_df_to_save.empty) and existing_output_header:
+        logger.info(f"No new rows to append to '{output_filename}'."); return
     if final_df_to_save is None or final_df_to_save.empty:
         logger.warning(f"No data to save to '{output_filename}'. Creating empty file with headers.")
         # Create an empty DataFrame with the correct headers and save it
@@ -632,6 +1510,10 @@ def format_and_save_data(final_df_to_save, original_input_df_for_headers_ref):
     output_df = output_df[final_header_order]
 
     try:
+        if existing_output_header:
+            output_df.reindex(columns=existing_output_header).to_csv(output_filename, mode='a', header=False, index=False, encoding='utf-8')
+            logger.info(f"SUCCESS: Appended {len(output_df)} entries to '{output_filename}'")
+            return
         output_df.to_csv(output_filename, index=False, encoding='utf-8-sig')
         logger.info(f"SUCCESS: Saved {len(output_df)} entries to '{output_filename}'")
         if not output_df.empty:
@@ -641,58 +1523,271 @@ def format_and_save_data(final_df_to_save, original_input_df_for_headers_ref):
         logger.error(f"Failed to save final data to '{output_filename}': {e_final_save}", exc_info=True)
 
 
+# --- Incremental daily runs  ---
+_ANCHOR_BYTES = 65536
+
+def _row_content_hash(row_values):
+    return hashlib.sha1('\x1f'.join(str(v).strip() for v in row_values).encode('utf-8')).hexdigest()[:16]
+
+def _input_anchor_hashes(input_file_path, byte_offset):
+    """Hashes the start of the input file and the bytes just before byte_offset, to tell an appended file from a rewritten one."""
+    with open(input_file_path, 'rb') as infile:
+        head_sha1 = hashlib.sha1(infile.read(min(byte_offset, _ANCHOR_BYTES))).hexdigest()
+    return head_sha1, _tail_sha1(input_file_path, byte_offset)
+
+def _tail_sha1(file_path, end_offset):
+    """Hashes the (up to _ANCHOR_BYTES) bytes just before end_offset."""
+    with open(file_path, 'rb') as infile:
+        tail_start = max(end_offset - _ANCHOR_BYTES, 0); infile.seek(tail_start)
+        return hashlib.sha1(infile.read(end_offset - tail_start)).hexdigest()
+
+def _fingerprint_file(state_file):
+    return state_file + '.fingerprints'
+
+def _is_appended_output_text(file_path, appended_text):
+    """True if appended_text is output rows with the output's column count (the last one may be cut short by a crash mid-write)."""
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as infile: header = next(csv.reader(infile), None)
+    complete_text, _, partial_line = appended_text.rpartition('\n')
+    complete_rows = list(csv.reader(io.StringIO(complete_text + '\n'))) if complete_text else []
+    partial_rows = list(csv.reader(io.StringIO(partial_line))) if partial_line else []
+    return bool(header) and all(len(row) == len(header) for row in complete_rows) and all(len(row) <= len(header) for row in partial_rows)
+
+def _is_appended_fingerprint_text(file_path, appended_text):
+    """True if appended_text is fingerprint lines (the last one may be cut short by a crash mid-write)."""
+    return re.fullmatch(r'([0-9a-f]{16}\n)*[0-9a-f]{0,15}', appended_text) is not None
+
+def _truncate_to_recorded_size(file_path, recorded_bytes, recorded_tail_sha1, description, is_appended_text):
+    """
+    Cuts bytes an interrupted run appended after the last saved state. Returns False if the file is shorter than recorded
+    (changed elsewhere). Returns None, leaving the file alone, if it grew by anything but rows this script appends after
+    unchanged recorded content (checked via recorded_tail_sha1 and is_appended_text).
+    """
+    actual_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    if actual_bytes < recorded_bytes: return False
+    if actual_bytes > recorded_bytes:
+        with open(file_path, 'rb') as infile: infile.seek(recorded_bytes); appended_bytes = infile.read()
+        try: appended_text = appended_bytes.decode('utf-8')
+        except UnicodeDecodeError: appended_text = None
+        if recorded_tail_sha1 != _tail_sha1(file_path, recorded_bytes) or appended_text is None or not is_appended_text(file_path, appended_text):
+            logger.critical(f"Incremental: The {description} '{file_path}' has {actual_bytes - recorded_bytes} byte(s) more than recorded that were not appended by an interrupted run. Leaving it untouched.")
+            return None
+        logger.warning(f"Incremental: Removing {actual_bytes - recorded_bytes} byte(s) an interrupted run appended to the {description} '{file_path}'.")
+        with open(file_path, 'r+b') as outfile: outfile.truncate(recorded_bytes)
+    return True
+
+def _new_incremental_state(input_file_path):
+    return {'input_path': os.path.abspath(input_file_path), 'byte_offset': None, 'header': None, 'head_sha1': None, 'anchor_sha1': None,
+            'rows_read': 0, 'pending_rows': [], 'output_bytes': 0, 'output_tail_sha1': None, 'fingerprint_bytes': 0, 'fingerprint_tail_sha1': None}
+
+def load_incremental_state(input_file_path, state_file=INCREMENTAL_STATE_FILE, output_filename=OUTPUT_FILENAME):
+    """
+    Loads the incremental state for this input file. Output and fingerprint rows appended after the state was last saved
+    (an interrupted run) are truncated away, so those rows are processed again rather than written twice. Starts afresh
+    (and the output is rewritten) if there is no state, it belongs to another input, or the output was shortened elsewhere.
+    Returns None if the output or fingerprint store grew by anything else, so it is not truncated or overwritten.
+    """
+    if os.path.exists(state_file) and os.path.exists(output_filename):
+        try:
+            with open(state_file, 'r', encoding='utf-8') as infile: state = json.load(infile)
+            if state.get('input_path') != os.path.abspath(input_file_path):
+                logger.warning(f"Incremental: State file '{state_file}' belongs to '{state.get('input_path')}'. Starting afresh.")
+            else:
+                output_size_ok = _truncate_to_recorded_size(output_filename, state['output_bytes'], state.get('output_tail_sha1'), 'output', _is_appended_output_text)
+                sizes_ok = output_size_ok and _truncate_to_recorded_size(_fingerprint_file(state_file), state['fingerprint_bytes'], state.get('fingerprint_tail_sha1'), 'fingerprint store', _is_appended_fingerprint_text)
+                if sizes_ok is None:
+                    logger.critical(f"Incremental: Check '{output_filename}' and the fingerprint store, or delete '{state_file}' to start afresh (which rewrites the output)."); return None
+                if not sizes_ok:
+                    logger.warning(f"Incremental: '{output_filename}' or the fingerprint store is shorter than recorded in '{state_file}'. Starting afresh.")
+                else:
+                    logger.info(f"Incremental: Loaded state from '{state_file}' ({state['rows_read']} rows read previously, {len(state['pending_rows'])} pending).")
+                    state['is_fresh'] = False; return state
+        except (OSError, ValueError, KeyError) as e: logger.warning(f"Incremental: Could not read state file '{state_file}': {e}. Starting afresh.")
+    else: logger.info(f"Incremental: No usable state ('{state_file}' or '{output_filename}' missing). Starting afresh.")
+    state = _new_incremental_state(input_file_path); state['is_fresh'] = True
+    return state
+
+def save_incremental_state(state, state_file=INCREMENTAL_STATE_FILE, output_filename=OUTPUT_FILENAME):
+    """
+    Records this run's fingerprints (appended, or rewritten after a full re-read) and then the state itself, including the
+    sizes the output and fingerprint store had at this point and a hash of their last bytes. Call after the output has been written.
+    """
+    fingerprint_file = _fingerprint_file(state_file)
+    if state.get('all_fingerprints') is not None:
+        with open(fingerprint_file + '.tmp', 'w', encoding='utf-8') as outfile: outfile.writelines(f"{row_hash}\n" for row_hash in state['all_fingerprints'])
+        os.replace(fingerprint_file + '.tmp', fingerprint_file)
+    elif state.get('new_fingerprints'):
+        with open(fingerprint_file, 'a', encoding='utf-8') as outfile: outfile.writelines(f"{row_hash}\n" for row_hash in state['new_fingerprints'])
+    state['output_bytes'] = os.path.getsize(output_filename) if os.path.exists(output_filename) else 0
+    state['fingerprint_bytes'] = os.path.getsize(fingerprint_file) if os.path.exists(fingerprint_file) else 0
+    state['output_tail_sha1'] = _tail_sha1(output_filename, state['output_bytes']) if state['output_bytes'] else None
+    state['fingerprint_tail_sha1'] = _tail_sha1(fingerprint_file, state['fingerprint_bytes']) if state['fingerprint_bytes'] else None
+    temp_file = state_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as outfile: json.dump({k: v for k, v in state.items() if k not in ('is_fresh', 'new_fingerprints', 'all_fingerprints')}, outfile, default=str)
+    os.replace(temp_file, state_file)
+    logger.debug(f"Incremental: Saved state to '{state_file}'.")
+
+def read_new_input_rows(input_file_path, state, state_file=INCREMENTAL_STATE_FILE):
+    """
+    Returns the input rows not yet seen by earlier runs (updating the read position and fingerprints in state), or None on a read error.
+    A CSV that has only been appended to is read from the stored byte offset and its new rows' fingerprints are simply appended
+    to the store. Anything else (first run, rewritten CSV, Excel) is read in full and rows are matched against the stored
+    fingerprints (content hash plus occurrence count, since duplicates are kept).
+    """
+    _ , extension = os.path.splitext(input_file_path)
+    if extension.lower() != '.csv':
+        full_df = read_input_file(input_file_path)
+        if full_df is None: return None
+        return _drop_seen_rows(full_df, state, state_file)
+
+    file_size = os.path.getsize(input_file_path)
+    byte_offset = state['byte_offset']
+    if byte_offset is not None and not (byte_offset <= file_size and _input_anchor_hashes(input_file_path, byte_offset) == (state['head_sha1'], state['anchor_sha1'])):
+        logger.warning(f"Incremental: '{input_file_path}' was changed other than by appending. Re-reading it in full and skipping rows already processed.")
+        byte_offset = None
+    read_from = byte_offset or 0
+    try:
+        with open(input_file_path, 'rb') as infile: infile.seek(read_from); new_bytes = infile.read()
+        # Only complete lines are consumed; a partly written last row is picked up by the next run.
+        new_bytes = new_bytes[:new_bytes.rfind(b'\n') + 1]
+        reader = csv.reader(io.StringIO(new_bytes.decode('utf-8-sig')))
+        header = state['header'] if byte_offset is not None else [h.strip() for h in next(reader, [])]
+        logger.info(f"Incremental: Read {len(new_bytes)} new byte(s) of '{input_file_path}' from offset {read_from}.")
+        data = _consolidate_csv_rows(header, reader, first_row_number=state['rows_read'] + 2 if byte_offset is not None else 2)
+        if data is None: return None
+        new_rows_df = _finalise_input_df(pd.DataFrame(data, columns=header))
+        if new_rows_df is None: return None
+    except Exception as e:
+        logger.critical(f"Incremental: Failed to read '{input_file_path}': {e}", exc_info=True); return None
+
+    state['header'] = header; state['byte_offset'] = read_from + len(new_bytes)
+    state['head_sha1'], state['anchor_sha1'] = _input_anchor_hashes(input_file_path, state['byte_offset'])
+    if byte_offset is not None:
+        state['rows_read'] += len(new_rows_df)
+        state['new_fingerprints'] = [_row_content_hash(row_values) for row_values in new_rows_df.itertuples(index=False)]
+        return new_rows_df
+    return _drop_seen_rows(new_rows_df, state, state_file)
+
+def _drop_seen_rows(full_df, state, state_file=INCREMENTAL_STATE_FILE):
+    """Keeps the rows of a fully re-read input whose fingerprint occurrence has not been processed before; the store is rewritten to match."""
+    stored_counts = {}
+    if not state['is_fresh'] and os.path.exists(_fingerprint_file(state_file)):
+        with open(_fingerprint_file(state_file), 'r', encoding='utf-8') as infile:
+            for line in infile: stored_counts[line.strip()] = stored_counts.get(line.strip(), 0) + 1
+    seen_counts = {}; is_new_mask = []; all_fingerprints = []
+    for row_values in full_df.itertuples(index=False):
+        row_hash = _row_content_hash(row_values); seen_counts[row_hash] = seen_counts.get(row_hash, 0) + 1
+        is_new_mask.append(seen_counts[row_hash] > stored_counts.get(row_hash, 0)); all_fingerprints.append(row_hash)
+    # Occurrences processed earlier but no longer in the file stay recorded, in case those rows come back.
+    for row_hash, stored_count in stored_counts.items(): all_fingerprints.extend([row_hash] * (stored_count - seen_counts.get(row_hash, 0)))
+    state['all_fingerprints'] = all_fingerprints; state['rows_read'] = len(full_df)
+    new_rows_df = full_df[is_new_mask]
+    logger.info(f"Incremental: {len(new_rows_df)} of {len(full_df)} input rows not processed before.")
+    return new_rows_df
+
+def run_incremental_update(input_file_path, context_filter, days=8, state_file=INCREMENTAL_STATE_FILE, output_filename=OUTPUT_FILENAME):
+    """Scrapes only rows added since the last run (plus still-pending ones) and merges the results into the existing output."""
+    state = load_incremental_state(input_file_path, state_file, output_filename)
+    if state is None: logger.critical("Incremental: Existing output could not be safely resumed. Script terminated."); return
+    with profiler.phase("Incremental - Read New Rows"): new_rows_df = read_new_input_rows(input_file_path, state, state_file)
+    if new_rows_df is None: logger.critical("Incremental: Input could not be read. Script terminated."); return
+    input_columns = new_rows_df.columns.tolist()
+    pending_rows_df = pd.DataFrame(state['pending_rows']).reindex(columns=input_columns + ['BSP Price Win', 'BSP Price Place'])
+    candidate_rows_df = pd.concat([pending_rows_df, new_rows_df.reindex(columns=pending_rows_df.columns)], ignore_index=True)
+    logger.info(f"Incremental: {len(new_rows_df)} new row(s) and {len(pending_rows_df)} pending row(s) from earlier runs.")
+
+    today = datetime.now().date(); cutoff_date = today - timedelta(days=days - 1)
+    candidate_dates = [dt.date() if pd.notna(dt) else None for dt in candidate_rows_df['time'].apply(_robust_to_datetime)]
+    # Built as bool Series explicitly: .apply on an empty Series yields object dtype, which cannot be used as a mask.
+    is_future = pd.Series([d is not None and d > today for d in candidate_dates], index=candidate_rows_df.index, dtype=bool)
+    is_in_window = pd.Series([d is not None and cutoff_date <= d <= today for d in candidate_dates], index=candidate_rows_df.index, dtype=bool)
+    # Rows past the window are final: new ones are skipped (as in a daily run), pending ones keep their last error status.
+    aged_out_rows_df = candidate_rows_df[~is_future & ~is_in_window & candidate_rows_df['BSP Price Win'].notna()]
+    held_rows_df = candidate_rows_df[is_future]
+    tasks_df = candidate_rows_df[is_in_window][input_columns]
+    skipped_count = int((~is_future & ~is_in_window).sum()) - len(aged_out_rows_df)
+    if skipped_count: logger.info(f"Incremental: {skipped_count} new row(s) fall outside the {days}-day window (or have no parseable time) and are skipped.")
+    if len(held_rows_df): logger.info(f"Incremental: {len(held_rows_df)} row(s) dated after today are held for a later run.")
+
+    results_df = pd.DataFrame(); all_failed_venue_date_pairs = set()
+    if not tasks_df.empty:
+        logger.info(f"Incremental: {len(tasks_df)} task(s) to scrape.")
+        with profiler.phase("Incremental - Scraping"):
+            results_list, all_failed_venue_date_pairs = run_scraping_session(tasks_df, context_filter)
+            valid_results_dfs = [df for df in results_list if df is not None and not df.empty]
+            if valid_results_dfs: results_df = pd.concat(valid_results_dfs, ignore_index=True)
+        log_scraping_summary(results_df, len(tasks_df))
+    else: logger.info("Incremental: No rows inside the date window to scrape.")
+
+    succeeded_results_df, failed_results_df = results_df, pd.DataFrame()
+    if not results_df.empty:
+        is_failed = results_df['BSP Price Win'].fillna('na_placeholder_for_error_check').astype(str).str.lower().isin(SCRIPT_ERROR_VALUES)
+        succeeded_results_df, failed_results_df = results_df[~is_failed], results_df[is_failed]
+    # A task the session returned no row for stays pending rather than being dropped.
+    returned_counts = {}
+    for row_values in results_df.reindex(columns=input_columns).itertuples(index=False): row_hash = _row_content_hash(row_values); returned_counts[row_hash] = returned_counts.get(row_hash, 0) + 1
+    is_missing_mask = []
+    for row_values in tasks_df.itertuples(index=False):
+        row_hash = _row_content_hash(row_values); is_missing_mask.append(returned_counts.get(row_hash, 0) <= 0); returned_counts[row_hash] = returned_counts.get(row_hash, 0) - 1
+    missing_rows_df = tasks_df[is_missing_mask]
+    if not missing_rows_df.empty: logger.warning(f"Incremental: {len(missing_rows_df)} task(s) got no result from the session. Keeping them pending.")
+    finished_rows_df = pd.concat([succeeded_results_df, aged_out_rows_df], ignore_index=True)
+    still_pending_df = pd.concat([held_rows_df, failed_results_df, missing_rows_df], ignore_index=True).reindex(columns=pending_rows_df.columns)
+    if not still_pending_df.empty: logger.info(f"Incremental: {len(still_pending_df)} row(s) remain pending and will be retried on the next run.")
+
+    with profiler.phase("Incremental - Save Output"): format_and_save_data(finished_rows_df, pd.DataFrame(columns=input_columns), output_filename, append=not state['is_fresh'])
+    state['pending_rows'] = still_pending_df.astype(object).where(still_pending_df.notna(), None).to_dict('records')
+    # The state is written after the output; if the run dies in between, the next load truncates the output back to the recorded size.
+    save_incremental_state(state, state_file, output_filename)
+    log_missed_venue_date_pairs(all_failed_venue_date_pairs)
+
 # --- main  ---
 if __name__ == "__main__":
     context_filter.current_date = 'Setup'
     logger.info("Script execution started.")
-    input_tasks_df_raw_schema_ref = get_input_csv()
-
-    if input_tasks_df_raw_schema_ref is None:
+    input_file_path = select_input_file()
+    # Incremental runs read the input themselves, from where the previous run stopped.
+    input_tasks_df_raw_schema_ref = read_input_file(input_file_path) if not INCREMENTAL_MODE else None
+
+    if INCREMENTAL_MODE:
+        if input_file_path: run_incremental_update(input_file_path, context_filter)
+        else: logger.critical("No input file selected. Script terminated.")
+    elif input_tasks_df_raw_schema_ref is None:
         logger.critical("Input CSV could not be loaded. Script terminated.")
     elif input_tasks_df_raw_schema_ref.empty:
         logger.warning("Input CSV loaded but is empty. No tasks to process.")
         format_and_save_data(pd.DataFrame(), input_tasks_df_raw_schema_ref)
+    elif OFFLINE_REEXTRACT_FROM_SNAPSHOTS:
+        # No date window here: the snapshot store decides which historical rows can be answered.
+        logger.info(f"--- Offline Re-extraction from '{SNAPSHOT_STORE_DIR}' for {len(input_tasks_df_raw_schema_ref)} tasks (no WebDriver) ---")
+        with profiler.phase("Main - Offline Re-extraction"): offline_results_df = extract_bsp_from_snapshots(input_tasks_df_raw_schema_ref.copy())
+        with profiler.phase("Main - Save Output"): format_and_save_data(offline_results_df, input_tasks_df_raw_schema_ref)
+    elif BACKFILL_START_DATE and not validate_backfill_range(BACKFILL_START_DATE, BACKFILL_END_DATE):
+        logger.critical("Backfill date range is invalid. Script terminated.")
     else:
         logger.info(f"Successfully loaded {len(input_tasks_df_raw_schema_ref)} raw tasks from CSV.")
-        all_failed_venue_date_pairs = set()
 
         # Per user request, do not remove duplicates from the input file.
         # The deduplication block that was here has been removed.
 
-        tasks_for_phase1_input = filter_tasks_for_last_n_days(input_tasks_df_raw_schema_ref.copy(), days=8)
+        with profiler.phase("Main - Date Filter"):
+            if BACKFILL_START_DATE:
+                date_window_label = f"backfill {BACKFILL_START_DATE} to {BACKFILL_END_DATE or 'today'}"
+                tasks_for_phase1_input = filter_tasks_for_date_range(input_tasks_df_raw_schema_ref.copy(), BACKFILL_START_DATE, BACKFILL_END_DATE)
+            else:
+                date_window_label = "8-day"
+                tasks_for_phase1_input = filter_tasks_for_last_n_days(input_tasks_df_raw_schema_ref.copy(), days=8)
 
         if tasks_for_phase1_input is None or tasks_for_phase1_input.empty:
-            logger.warning("No tasks remaining after 8-day date filtering. No scraping.")
+            logger.warning(f"No tasks remaining after {date_window_label} date filtering. No scraping.")
             format_and_save_data(pd.DataFrame(), input_tasks_df_raw_schema_ref)
         else:
             total_tasks_attempted = len(tasks_for_phase1_input)
-            logger.info(f"{total_tasks_attempted} tasks to be processed after 8-day filter.")
-            logger.info("--- Starting Scraping Phase 1 (Exact Venue Match) ---")
-            phase1_enriched_results_df, phase1_retry_candidates_tasks_df, phase1_failures = scrape_and_enrich_csv(
-                tasks_for_phase1_input.copy(),
-                context_filter,
-                current_phase_name="Phase 1 (Exact Venue)"
-            )
-            all_failed_venue_date_pairs.update(phase1_failures)
-            logger.info(f"--- Phase 1 Finished. Processed {len(phase1_enriched_results_df)} task results. Identified {len(phase1_retry_candidates_tasks_df)} for retry. ---")
-
-            all_phases_results_list = [phase1_enriched_results_df]
-
-            if phase1_retry_candidates_tasks_df is not None and not phase1_retry_candidates_tasks_df.empty:
-                logger.info(f"--- Starting Scraping Phase 2 (Retry & Fuzzy Venue Match for {len(phase1_retry_candidates_tasks_df)} tasks) ---")
-                phase2_enriched_results_df, phase2_still_needs_retry_df, phase2_failures = scrape_and_enrich_csv(
-                    phase1_retry_candidates_tasks_df.copy(),
-                    context_filter,
-                    current_phase_name="Phase 2 (Fuzzy Venue)",
-                    fuzzy_venue_matching=True
-                )
-                all_failed_venue_date_pairs.update(phase2_failures)
-                logger.info(f"--- Phase 2 Finished. Processed {len(phase2_enriched_results_df)} retry task results. ---")
-                if phase2_still_needs_retry_df is not None and not phase2_still_needs_retry_df.empty:
-                    logger.warning(f"{len(phase2_still_needs_retry_df)} tasks still marked for retry after Phase 2 (will not be retried further).")
-                all_phases_results_list.append(phase2_enriched_results_df)
-            else:
-                logger.info("No tasks identified for Phase 2 retry.")
+            logger.info(f"{total_tasks_attempted} tasks to be processed after {date_window_label} filter.")
+            with profiler.phase("Main - Scraping"):
+                if BACKFILL_START_DATE:
+                    all_phases_results_list, all_failed_venue_date_pairs = run_backfill(tasks_for_phase1_input, context_filter)
+                else:
+                    all_phases_results_list, all_failed_venue_date_pairs = run_scraping_session(tasks_for_phase1_input, context_filter)
 
             final_combined_output_df = pd.DataFrame()
             valid_phase_results_dfs = [df for df in all_phases_results_list if df is not None and not df.empty]
@@ -700,52 +1795,15 @@ if __name__ == "__main__":
             if valid_phase_results_dfs:
                 # Per user request, combine results without dropping any duplicates.
                 logger.info(f"Combining results from all phases. All processed rows will be preserved.")
-                final_combined_output_df = pd.concat(valid_phase_results_dfs, ignore_index=True)
+                with profiler.phase("Main - Combine Results"): final_combined_output_df = pd.concat(valid_phase_results_dfs, ignore_index=True)
             else:
                 logger.warning("No valid results from any scraping phase.")
 
-            logger.info(f"Total rows in final output (includes retries): {len(final_combined_output_df)}")
-            if not final_combined_output_df.empty:
-                script_error_values = [
-                    'date previously failed this phase', 'date selection error', 'date data not loaded',
-                    'unknown race code', 'code selection error', 'venue load error', 'driver setup error phase',
-                    'date parse error for grouping', 'venue data unavailable', 'venue element error',
-                    'venue element error mid-race', 'race timeout', 'race element missing',
-                    'race stale element', 'race error', 'runner not found on page',
-                    'stale element', 'scrape error', 'processing incomplete', 'ambiguous fuzzy match'
-                ]
-
-                # Case-insensitive search for the BSP column to perform the success check
-                bsp_win_col_actual_name = None
-                for col in final_combined_output_df.columns:
-                    if str(col).lower() == 'bsp price win':
-                        bsp_win_col_actual_name = col
-                        break
-                
-                if bsp_win_col_actual_name:
-                    error_check_series = final_combined_output_df[bsp_win_col_actual_name].fillna('na_placeholder_for_error_check').astype(str).str.lower()
-                    failed_scrapes_mask_final = error_check_series.isin(script_error_values)
-                    failed_scrapes_count_final = failed_scrapes_mask_final.sum()
-                    successful_scrapes_count_final = len(final_combined_output_df) - failed_scrapes_count_final
-                else:
-                    logger.warning(f"Column 'BSP Price Win' (case-insensitive) missing from final combined data. Cannot calculate success/failure stats accurately.")
-                    failed_scrapes_count_final = len(final_combined_output_df); successful_scrapes_count_final = 0
-
-                logger.info("--- OVERALL SCRAPING SUMMARY ---")
-                logger.info(f"  Total Tasks Attempted: {total_tasks_attempted}")
-                logger.info(f"  Successfully Scraped (valid BSP data or 'N/A'): {successful_scrapes_count_final}")
-                logger.info(f"  Failed Scrapes (Script Error, Not Found, etc.): {failed_scrapes_count_final}")
-                logger.info("--------------------------------")
-            else: logger.info("--- OVERALL SCRAPING SUMMARY --- Final combined DataFrame is empty. ---")
-
-            format_and_save_data(final_combined_output_df, input_tasks_df_raw_schema_ref)
-
-            if all_failed_venue_date_pairs:
-                logger.info("--- MISSED VENUE-DATE PAIRS ---")
-                sorted_failures = sorted(list(all_failed_venue_date_pairs))
-                for date, venue in sorted_failures:
-                    logger.info(f"  - Date: {date}, Venue/Reason: {venue}")
-                logger.info("-------------------------------")
+            log_scraping_summary(final_combined_output_df, total_tasks_attempted)
+
+            with profiler.phase("Main - Save Output"): format_and_save_data(final_combined_output_df, input_tasks_df_raw_schema_ref)
+
+            log_missed_venue_date_pairs(all_failed_venue_date_pairs)
 
     context_filter.current_date = 'Shutdown'
     logger.info("Script execution finished.")
\ No newline at end of file